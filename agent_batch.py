@@ -0,0 +1,255 @@
+"""
+Headless batch runs.
+
+Runs many tasks through the agent without a terminal. Tasks are read from a
+JSONL file (or stdin), up to --concurrency sessions run at once, and each
+result is appended to the output JSONL as soon as its task finishes:
+
+  {"id": "t1", "status": "ok", "final": "...", "tools": [...], "usage": {...},
+   "model_calls": 4, "latency_s": 12.3}
+
+A task is {"id": "...", "prompt": "..."}, or "prompts": [...] for several
+turns of one conversation; a bare JSON string is a prompt. Tasks without an
+id are named after their line number. `tools` lists every tool call with its
+arguments, duration and result size, and `usage` the tokens of every model
+call summed. A task past --task-timeout has its model call and tools
+cancelled (run_bash commands are killed) before its record is written.
+
+Sessions in this process share one SDK client and the tool caches, and all
+work in the current directory. A task with a "cwd" (one repository of many,
+say) runs in a child process started there instead, because the tools
+resolve paths against the process's working directory.
+
+Resume: results are appended, and tasks whose id already has a result in the
+output file are skipped, so re-running the same command after a crash picks
+up where it stopped. --retry-errors also re-runs the tasks that failed.
+
+Usage:
+  python agent_batch.py tasks.jsonl -o results.jsonl --concurrency 8
+  cat tasks.jsonl | python agent_batch.py - -o results.jsonl
+  python agent_batch.py tasks.jsonl -o results.jsonl --provider anthropic --task-timeout 600
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+from agent_server import HTTP2, RecordingOutput
+from agent_tools import close_session, shell_sessions
+from providers import LazyClient, get_provider, tracer
+from tracing import finish_tracing
+
+
+class TaskError(Exception):
+    """A tasks file that cannot be run; the message names the line."""
+
+
+def load_tasks(lines) -> list:
+    tasks = []
+    seen = set()
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            task = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise TaskError(f"line {number}: {e}") from None
+        if isinstance(task, str):
+            task = {"prompt": task}
+        if not isinstance(task, dict):
+            raise TaskError(f"line {number}: a task is an object or a string")
+        task["id"] = str(task.get("id") or f"line-{number}")
+        if "prompts" not in task:
+            if "prompt" not in task:
+                raise TaskError(f"line {number}: task has no prompt")
+            task["prompts"] = [task["prompt"]]
+        if task["id"] in seen:
+            raise TaskError(f"line {number}: task id {task['id']} is used twice")
+        seen.add(task["id"])
+        tasks.append(task)
+    return tasks
+
+
+def finished_ids(path: str, retry_errors: bool = False) -> set:
+    """Ids of the tasks that already have a result in the output file."""
+    done = set()
+    try:
+        with open(path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # a line cut short by a crash
+                if record.get("status") == "ok" or not retry_errors:
+                    done.add(record.get("id"))
+    except FileNotFoundError:
+        pass
+    return done
+
+
+def open_results(path: str):
+    """The output file, opened to append whole lines."""
+    if path == "-":
+        return sys.stdout
+    f = open(path, "a+")
+    if f.tell() > 0:
+        f.seek(f.tell() - 1)
+        if f.read(1) != "\n":
+            f.write("\n")  # end the line a crash cut short, so the next record stays valid
+    return f
+
+
+async def run_task(provider, task: dict, client=None, timeout: float = None) -> dict:
+    """Run one task in this process and return its result record."""
+    session_id = task["id"]
+    tools = []
+    model_calls = 0
+
+    def on_span(span, args):
+        nonlocal model_calls
+        if span.kind == "model":
+            model_calls += 1
+            return
+        call = {"name": span.name, "args": args, "seconds": round(span.duration, 3), "bytes": span.bytes_out}
+        if span.error:
+            call["error"] = span.error
+        tools.append(call)
+
+    session = provider.make_session(session_id, output=RecordingOutput(), client=client, on_span=on_span)
+
+    async def conversation():
+        return [await session.send(prompt) for prompt in task["prompts"]]
+
+    record = {"id": session_id}
+    start = time.perf_counter()
+    try:
+        replies = await asyncio.wait_for(conversation(), timeout)
+        record.update(status="ok", final=replies[-1])
+        if len(replies) > 1:
+            record["replies"] = replies
+    except asyncio.TimeoutError:
+        record.update(status="error", error=f"timed out after {timeout:g}s")
+    except Exception as e:
+        record.update(status="error", error=f"{type(e).__name__}: {e}")
+    finally:
+        close_session(session_id)
+    record.update(tools=tools, usage=session.usage, model_calls=model_calls, latency_s=round(time.perf_counter() - start, 3))
+    return record
+
+
+async def run_in_child(provider, task: dict, timeout: float = None) -> dict:
+    """Run one task in a child process started in the task's cwd."""
+    command = [sys.executable, os.path.abspath(__file__), "--one", "--provider", provider.name]
+    if timeout:
+        command += ["--task-timeout", str(timeout)]
+    start = time.perf_counter()
+    try:
+        child = await asyncio.create_subprocess_exec(
+            *command,
+            cwd=task["cwd"],
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+    except OSError as e:
+        return {"id": task["id"], "status": "error", "error": f"cannot start in {task['cwd']}: {e.strerror}"}
+    out, err = await child.communicate(json.dumps(task).encode())
+    lines = out.decode(errors="replace").strip().splitlines()
+    try:
+        return json.loads(lines[-1])  # the record is the last line
+    except (IndexError, json.JSONDecodeError):
+        problem = err.decode(errors="replace").strip().splitlines()
+        message = problem[-1] if problem else f"exit status {child.returncode}"
+        return {"id": task["id"], "status": "error", "error": message, "latency_s": round(time.perf_counter() - start, 3)}
+
+
+async def run_batch(provider, tasks: list, results, concurrency: int, timeout: float = None) -> dict:
+    """Run tasks, at most `concurrency` at a time, writing each record to results."""
+    # One client, hence one keep-alive connection pool, for every in-process session
+    client = LazyClient(lambda: provider.make_client(http2=HTTP2))
+    slots = asyncio.Semaphore(concurrency)
+    counts = {"ok": 0, "error": 0}
+
+    async def run(task):
+        async with slots:
+            if task.get("cwd"):
+                record = await run_in_child(provider, task, timeout)
+            else:
+                record = await run_task(provider, task, client, timeout)
+        # Records are written from the event loop thread only, one whole line at a time
+        results.write(json.dumps(record) + "\n")
+        results.flush()
+        counts[record["status"]] += 1
+        done = counts["ok"] + counts["error"]
+        print(f"[{done}/{len(tasks)}] {record['id']} {record['status']} {record.get('latency_s', 0):.1f}s", file=sys.stderr)
+
+    if any(not task.get("cwd") for task in tasks):
+        provider.warm_up()  # import the SDK while the first tasks start
+    try:
+        await asyncio.gather(*(run(task) for task in tasks))
+    finally:
+        await client.close()
+    return counts
+
+
+def run_one(provider, timeout: float = None):
+    """--one: run the task on stdin and print its record (for run_in_child)."""
+    task = json.loads(sys.stdin.read())
+    print(json.dumps(asyncio.run(run_task(provider, task, timeout=timeout))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run many prompts through the agent, without a terminal")
+    parser.add_argument("tasks", nargs="?", default="-", help="JSONL file of tasks, or - for stdin (default)")
+    parser.add_argument("-o", "--output", default="-", help="JSONL file to append results to (default: stdout)")
+    parser.add_argument("--concurrency", type=int, default=4, help="sessions to run at once")
+    parser.add_argument("--task-timeout", type=float, help="give up on a task after this many seconds")
+    parser.add_argument("--retry-errors", action="store_true", help="re-run tasks whose earlier result was an error")
+    parser.add_argument("--provider", choices=["openai", "anthropic", "ollama"], help="model provider (default: $PROVIDER or openai)")
+    parser.add_argument("--one", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    provider = get_provider(args.provider)
+
+    if args.one:
+        run_one(provider, args.task_timeout)
+        return True
+
+    try:
+        if args.tasks == "-":
+            tasks = load_tasks(sys.stdin)
+        else:
+            with open(args.tasks) as f:
+                tasks = load_tasks(f)
+    except (OSError, TaskError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return False
+    skipped = 0
+    if args.output != "-":
+        done = finished_ids(args.output, args.retry_errors)
+        pending = [task for task in tasks if task["id"] not in done]
+        skipped = len(tasks) - len(pending)
+        tasks = pending
+
+    results = open_results(args.output)
+    start = time.perf_counter()
+    try:
+        counts = asyncio.run(run_batch(provider, tasks, results, max(args.concurrency, 1), args.task_timeout))
+    finally:
+        if results is not sys.stdout:
+            results.close()
+        shell_sessions.close_all()
+        finish_tracing(tracer)
+    print(
+        f"{counts['ok']} ok, {counts['error']} failed, {skipped} already done, in {time.perf_counter() - start:.1f}s",
+        file=sys.stderr,
+    )
+    return counts["error"] == 0
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,413 @@
+"""
+Asyncio agent core.
+
+An AgentSession holds one conversation and runs each user turn: call the
+model, run the tools it asks for, feed the results back, and repeat until
+it answers. Model calls go through the async SDK clients (AsyncOpenAI /
+AsyncAnthropic), run_bash through asyncio subprocesses and file tools
+through a thread pool, so a single process can drive many sessions at once.
+The REPL that solution.py and solution_anthropic.py run (agent_repl.py) is a
+thin front end.
+
+Each session keeps the features of the original loops: streaming, the
+concurrent tool scheduler, context compaction and (for Anthropic) prompt
+caching. With a `response_cache` (llm_cache.py), model calls are recorded
+and replayed. With a `tracer` (tracing.py), every turn, model call and tool
+call is recorded as a span. With a `result_limiter` (result_limits.py),
+tool results over its token budget are shrunk before they join the history.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import json
+import secrets
+from types import SimpleNamespace
+
+from compaction import compact, estimate_tokens
+from llm_cache import plain
+from prompt_cache import cache_summary, cached_messages, cached_system, cached_tools
+from streaming import TurnTimer, parse_arguments, stream_anthropic, stream_openai
+from tool_scheduler import ToolScheduler
+from tracing import DISABLED
+
+# The conversation a tool call belongs to, e.g. to pick its shell session.
+# asyncio tasks and executor threads started by a session inherit it.
+current_session = contextvars.ContextVar("current_session", default="default")
+
+# The tool result for a call whose arguments could not be parsed; the tool is not run
+INVALID_ARGUMENTS = "Error: tool arguments are not a valid JSON object"
+
+
+class ConsoleOutput:
+    """Prints a session's activity to the terminal, as the REPL always has."""
+
+    def __init__(self):
+        self.printed_text = False
+        self.line_open = False
+
+    def start_turn(self):
+        self.printed_text = False
+        self.line_open = False
+
+    def text(self, chunk: str):
+        """A piece of streamed reply text."""
+        if not self.printed_text:
+            print("\nAgent: ", end="")
+            self.printed_text = True
+        print(chunk, end="", flush=True)
+        self.line_open = True
+
+    def reply(self, text: str):
+        """A complete (non-streamed) final reply."""
+        print(f"\nAgent: {text}")
+
+    def tool(self, name: str, args: dict):
+        self._close_line()
+        print(f"  [tool] {name}({args})")
+
+    def status(self, kind: str, message: str):
+        self._close_line()
+        print(f"  [{kind}] {message}")
+
+    def _close_line(self):
+        if self.line_open:
+            print()
+            self.line_open = False
+
+
+class AgentSession:
+    """Provider-independent part of a conversation.
+
+    `execute_tool` is a coroutine function (name, args) -> str. Subclasses
+    implement `_step()`, which makes one model call, runs any tool calls and
+    returns (done, final_text).
+    """
+
+    def __init__(
+        self,
+        client,
+        model: str,
+        tools: list,
+        execute_tool,
+        system_prompt: str,
+        max_tokens: int = 4096,
+        stream: bool = False,
+        context_budget: int = 0,
+        session_id: str = "default",
+        output=None,
+        on_drop=None,
+        response_cache=None,
+        tracer=None,
+        result_limiter=None,
+        tool_registry=None,
+        on_prompt=None,
+        on_result=None,
+        on_span=None,
+    ):
+        self.client = client
+        self.model = model
+        self.tools = tools
+        self.execute_tool = execute_tool
+        self.system_prompt = system_prompt
+        self.max_tokens = max_tokens
+        self.stream = stream
+        self.context_budget = context_budget
+        self.session_id = session_id
+        self.output = output or ConsoleOutput()
+        self.on_drop = on_drop  # told about tool results that compaction or the result limit cut
+        self.response_cache = response_cache
+        self.tracer = tracer or DISABLED
+        self.result_limiter = result_limiter
+        self.tool_registry = tool_registry  # read-only and path metadata for the scheduler
+        # Told about each user prompt and tool result, e.g. to prefetch files
+        # while the next model call is in flight; must return at once
+        self.on_prompt = on_prompt
+        self.on_result = on_result
+        # Told about each model and tool span once it ends, with a tool call's
+        # arguments (None for a model call), e.g. to count and time calls
+        self.on_span = on_span
+        self.scheduler = None  # the current step's, so a cancelled turn can stop its tools
+        self.trace_id = secrets.token_hex(16)  # one trace per conversation
+        self.turn_span = None
+        self.usage = {}  # token counts summed over every model call, as in the span usage
+        self.messages = []
+
+    async def send(self, user_input: str) -> str:
+        """Run one user turn: call the model until it stops asking for tools.
+
+        Returns the model's final text.
+        """
+        self.messages.append({"role": "user", "content": user_input})
+        if self.on_prompt is not None:
+            self.on_prompt(user_input)
+        token = current_session.set(self.session_id)
+        try:
+            with self.tracer.span("turn", "turn", trace_id=self.trace_id, session=self.session_id) as self.turn_span:
+                while True:
+                    if self.context_budget:
+                        saved = compact(self.messages, self.context_budget, on_drop=self.on_drop)
+                        if saved:
+                            after = estimate_tokens(self.messages)
+                            self.output.status("compact", f"{after + saved:,} -> {after:,} tokens (saved {saved:,})")
+                    self.output.start_turn()
+                    try:
+                        done, text = await self._step()
+                    except asyncio.CancelledError:
+                        # e.g. a batch task's timeout: its tools must not keep running
+                        if self.scheduler is not None:
+                            await self.scheduler.cancel()
+                        raise
+                    if done:
+                        return text
+        finally:
+            current_session.reset(token)
+
+    async def _step(self):
+        raise NotImplementedError
+
+    def tool_scheduler(self) -> ToolScheduler:
+        """A scheduler for one turn's tool calls."""
+        if self.tool_registry is None:
+            self.scheduler = ToolScheduler(self.run_tool)
+        else:
+            self.scheduler = ToolScheduler(self.run_tool, self.tool_registry.read_only_tools(), self.tool_registry.tool_path)
+        return self.scheduler
+
+    @contextlib.contextmanager
+    def span(self, kind: str, name: str, args: dict = None, **attributes):
+        """A span under the current turn, passed to on_span once it ends."""
+        try:
+            with self.tracer.span(kind, name, parent=self.turn_span, session=self.session_id, **attributes) as span:
+                yield span
+        finally:
+            if self.on_span is not None:
+                self.on_span(span, args)
+
+    def model_span(self):
+        return self.span("model", self.model, stream=self.stream)
+
+    def add_usage(self, span):
+        for field, count in span.usage.items():
+            self.usage[field] = self.usage.get(field, 0) + count
+
+    async def run_tool(self, name: str, args: dict) -> str:
+        """execute_tool, traced. The tool scheduler calls this."""
+        with self.span("tool", name, args) as span:
+            result = await self.execute_tool(name, args)
+            if self.result_limiter is not None:
+                limited = self.result_limiter.limit(name, args, result)
+                if limited is not result:
+                    span.attributes["truncated_from_bytes"] = len(result.encode())
+                    result = limited
+                    # The model never gets the whole result, so e.g. a later read_file
+                    # must not answer "unchanged since your last read"
+                    if self.on_drop is not None:
+                        self.on_drop(name, args)
+            if self.on_result is not None:
+                self.on_result(name, args, result)
+            span.bytes_in = len(json.dumps(args).encode())
+            span.bytes_out = len(result.encode())
+            if result.startswith("Error"):
+                span.error = result.splitlines()[0]
+            return result
+
+
+async def _result(text: str) -> str:
+    """A tool result that needs no tool run, awaitable like a scheduled one."""
+    return text
+
+
+def _json_size(obj) -> int:
+    return len(json.dumps(plain(obj)).encode())
+
+
+class OpenAISession(AgentSession):
+    """A conversation with an OpenAI-compatible chat completions endpoint.
+
+    `request_options` are extra fields for every request (e.g.
+    parallel_tool_calls); with `stream_usage`, streamed replies end with a
+    usage chunk. Both are left off for servers that may not know them.
+    """
+
+    def __init__(self, *args, request_options: dict = None, stream_usage: bool = False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.request_options = request_options or {}
+        self.stream_usage = stream_usage
+        self.messages = [{"role": "system", "content": self.system_prompt}]
+
+    async def _step(self):
+        scheduler = self.tool_scheduler()
+        pending = []
+
+        def on_tool_call(call, args):
+            name = call["function"]["name"]
+            if args is None:
+                pending.append((call["id"], _result(INVALID_ARGUMENTS)))
+                return
+            self.output.tool(name, args)
+            pending.append((call["id"], scheduler.submit(name, args)))
+
+        request = dict(model=self.model, max_tokens=self.max_tokens, tools=self.tools, messages=self.messages)
+        request.update(self.request_options)
+        with self.model_span() as span:
+            message, timer = await self._call_model(request, on_tool_call, span)
+            if self.tracer.recording:
+                span.bytes_in = _json_size(request)
+                span.bytes_out = _json_size(message)
+        self.add_usage(span)
+
+        # Add assistant response to conversation history
+        self.messages.append(message)
+        for tool_call_id, task in pending:
+            self.messages.append({"role": "tool", "tool_call_id": tool_call_id, "content": await task})
+
+        if self.stream:
+            self.output.status("timing", timer.summary())
+        if pending:
+            return False, None
+        text = message.get("content") or ""
+        if text and not self.stream:
+            self.output.reply(text)
+        return True, text
+
+    async def _call_model(self, request, on_tool_call, span):
+        """One model call, or the replay of a recorded one. Returns (message, timer)."""
+        message = self.response_cache.get(request) if self.response_cache else None
+        if message is not None:
+            # Replay a recorded reply as if it had just arrived
+            span.attributes["replayed"] = True
+            timer = TurnTimer()
+            if self.stream and message.get("content"):
+                self.output.text(message["content"])
+            for call in message.get("tool_calls", []):
+                on_tool_call(call, parse_arguments(call["function"]["arguments"]))
+            timer.finish()
+            return message, timer
+
+        if self.stream:
+            options = {"stream_options": {"include_usage": True}} if self.stream_usage else {}
+            message, timer, usage = await stream_openai(
+                self.client, on_text=self.output.text, on_tool_call=on_tool_call, **request, **options
+            )
+        else:
+            timer = TurnTimer()
+            response = await self.client.chat.completions.create(**request)
+            timer.finish()
+            message = _assistant_dict(response.choices[0].message)
+            usage = response.usage
+            for call in message.get("tool_calls", []):
+                on_tool_call(call, parse_arguments(call["function"]["arguments"]))
+        if usage is not None:
+            span.set_usage(usage)
+        if self.response_cache:
+            self.response_cache.put(request, message)
+        return message, timer
+
+
+def _assistant_dict(message) -> dict:
+    """An SDK ChatCompletionMessage as a plain dict for the history."""
+    result = {"role": "assistant", "content": message.content}
+    if message.tool_calls:
+        result["tool_calls"] = [
+            {
+                "id": call.id,
+                "type": "function",
+                "function": {"name": call.function.name, "arguments": call.function.arguments or "{}"},
+            }
+            for call in message.tool_calls
+        ]
+    return result
+
+
+class AnthropicSession(AgentSession):
+    """A conversation with the native Anthropic Messages API."""
+
+    def __init__(self, *args, prompt_cache: bool = True, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prompt_cache = prompt_cache
+        self.cached_system = cached_system(self.system_prompt)
+        self.cached_tools = cached_tools(self.tools)
+
+    def request_args(self) -> dict:
+        """Arguments for one Messages API call, with cache breakpoints if enabled."""
+        request = dict(model=self.model, max_tokens=self.max_tokens)
+        if self.prompt_cache:
+            request.update(system=self.cached_system, tools=self.cached_tools, messages=cached_messages(self.messages))
+        else:
+            request.update(system=self.system_prompt, tools=self.tools, messages=self.messages)
+        return request
+
+    async def _step(self):
+        scheduler = self.tool_scheduler()
+        pending = []
+
+        def on_tool_call(block):
+            self.output.tool(block.name, block.input)
+            pending.append((block.id, scheduler.submit(block.name, block.input)))
+
+        request = self.request_args()
+        with self.model_span() as span:
+            response, content, timer = await self._call_model(request, on_tool_call, span)
+            if self.tracer.recording:
+                span.bytes_in = _json_size(request)
+                span.bytes_out = _json_size(content)
+        self.add_usage(span)
+
+        # Add assistant response to conversation history
+        self.messages.append({"role": "assistant", "content": content})
+        if pending:
+            tool_results = [
+                {"type": "tool_result", "tool_use_id": tool_use_id, "content": await task}
+                for tool_use_id, task in pending
+            ]
+            self.messages.append({"role": "user", "content": tool_results})
+
+        if self.prompt_cache and not span.attributes.get("replayed"):
+            self.output.status("cache", cache_summary(response.usage))
+        if self.stream:
+            self.output.status("timing", timer.summary())
+        if pending:
+            return False, None
+        text = "".join(block.text for block in response.content if hasattr(block, "text"))
+        if not self.stream:
+            for block in response.content:
+                if hasattr(block, "text"):
+                    self.output.reply(block.text)
+        return True, text
+
+    async def _call_model(self, request, on_tool_call, span):
+        """One model call, or the replay of a recorded one.
+
+        Returns (response, content for the history, timer).
+        """
+        recorded = self.response_cache.get(request) if self.response_cache else None
+        if recorded is not None:
+            # Replay a recorded reply as if it had just arrived
+            span.attributes["replayed"] = True
+            timer = TurnTimer()
+            response = SimpleNamespace(
+                content=[SimpleNamespace(**block) for block in recorded["content"]],
+                usage=SimpleNamespace(**recorded.get("usage", {})),
+            )
+            for block in response.content:
+                if block.type == "text" and self.stream:
+                    self.output.text(block.text)
+                elif block.type == "tool_use":
+                    on_tool_call(block)
+            timer.finish()
+            return response, recorded["content"], timer
+
+        if self.stream:
+            response, timer = await stream_anthropic(self.client, on_text=self.output.text, on_tool_call=on_tool_call, **request)
+        else:
+            timer = TurnTimer()
+            response = await self.client.messages.create(**request)
+            timer.finish()
+            for block in response.content:
+                if block.type == "tool_use":
+                    on_tool_call(block)
+        span.set_usage(response.usage)
+        if self.response_cache:
+            self.response_cache.put(request, {"content": response.content, "usage": response.usage})
+        return response, response.content, timer
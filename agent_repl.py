@@ -0,0 +1,57 @@
+"""
+The terminal front end both solutions share.
+
+`main(provider)` watches the workspace, runs the REPL against one session of
+the given provider (a providers.Provider) and cleans up on exit. Importing
+this module builds no provider: solution.py and solution_anthropic.py each
+build the one they talk to and pass it in.
+"""
+
+import asyncio
+import sys
+
+from agent_tools import prefetcher, shell_sessions, start_watcher, stop_watcher
+from providers import tracer
+from tracing import finish_tracing
+
+
+async def repl(provider):
+    """Read prompts from the terminal and send them to one session."""
+    session = provider.make_session()
+    provider.warm_up()  # while the user types
+
+    print("AI Coding Agent (type 'quit' to exit)")
+    print("=" * 40)
+
+    while True:
+        # Get user input
+        try:
+            user_input = input("\nYou: ").strip()
+        except (EOFError, KeyboardInterrupt):
+            print("\nGoodbye!")
+            break
+
+        if not user_input:
+            continue
+        if user_input.lower() in ("quit", "exit"):
+            print("Goodbye!")
+            break
+
+        await session.send(user_input)
+
+
+def agent_loop(provider):
+    """Main conversation loop."""
+    asyncio.run(repl(provider))
+
+
+def main(provider):
+    watcher = start_watcher()
+    try:
+        agent_loop(provider)
+    finally:
+        stop_watcher(watcher)
+        shell_sessions.close_all()
+        finish_tracing(tracer)
+        if tracer.recording:
+            print(f"prefetch: {prefetcher.summary()}", file=sys.stderr)
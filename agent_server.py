@@ -0,0 +1,317 @@
+"""
+Multi-session agent server.
+
+Hosts many agent conversations in one process behind a small JSON HTTP API,
+instead of one REPL process per user. All sessions share one SDK client and
+so one HTTP connection pool to the provider: connections are kept alive and
+reused across sessions (HTTP/2 when the `h2` package is installed), so a new
+session does not pay a fresh TCP/TLS handshake. Sessions that sit idle are
+evicted, together with their shell session.
+
+Usage:
+  python agent_server.py                    # the provider PROVIDER names (default openai)
+  python agent_server.py --provider ollama  # or openai / anthropic (--anthropic is short for the latter)
+  python agent_server.py --port 8000 --idle-timeout 600 --max-sessions 50
+
+API (JSON bodies):
+  POST   /sessions            {"message": "..."}  start a session; returns its id and reply
+  POST   /sessions/<id>       {"message": "..."}  send a turn to a session
+  GET    /sessions                                list sessions
+  DELETE /sessions/<id>                           end a session
+
+Every session runs in the same working directory; BASH_SESSION=1 gives each
+its own shell, so `cd` in one does not move the others.
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from agent_tools import close_session, start_watcher, stop_watcher
+from providers import get_provider, tracer
+from tracing import finish_tracing
+
+HTTP2 = importlib.util.find_spec("h2") is not None
+
+
+class RecordingOutput:
+    """Collects a session's activity for the HTTP reply instead of printing it."""
+
+    def __init__(self):
+        self.events = []
+
+    def start_turn(self):
+        pass
+
+    def text(self, chunk: str):
+        pass  # the final text is returned as the reply
+
+    def reply(self, text: str):
+        pass
+
+    def tool(self, name: str, args: dict):
+        self.events.append({"type": "tool", "name": name, "args": args})
+
+    def status(self, kind: str, message: str):
+        self.events.append({"type": kind, "message": message})
+
+    def drain(self) -> list:
+        events, self.events = self.events, []
+        return events
+
+
+class RegistryFull(Exception):
+    """Every session slot is taken by a session that is mid-turn."""
+
+
+class _Entry:
+    def __init__(self, session, output):
+        self.session = session
+        self.output = output
+        self.lock = asyncio.Lock()  # one turn at a time per conversation
+        self.created = time.monotonic()
+        self.last_used = self.created
+        self.turns = 0
+
+
+class SessionRegistry:
+    """Live sessions by id, with idle eviction.
+
+    Runs entirely on the event loop thread. `make_session(session_id, output)`
+    creates a session; `on_close(session_id)` releases anything held for it
+    outside the session object (its shell, what it has read).
+    """
+
+    def __init__(self, make_session, idle_timeout: float = 900, max_sessions: int = 100, on_close=None):
+        self.make_session = make_session
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self.on_close = on_close
+        self.sessions = {}
+
+    def get(self, session_id: str = None) -> tuple:
+        """Return (session_id, entry), creating the session if needed."""
+        session_id = session_id or uuid.uuid4().hex[:12]
+        entry = self.sessions.get(session_id)
+        if entry is None:
+            if len(self.sessions) >= self.max_sessions:
+                self._evict_oldest()
+            output = RecordingOutput()
+            entry = _Entry(self.make_session(session_id, output), output)
+            self.sessions[session_id] = entry
+        return session_id, entry
+
+    async def send(self, session_id: str, message: str) -> dict:
+        """Run one turn in a session and return its reply and tool activity."""
+        session_id, entry = self.get(session_id)
+        async with entry.lock:
+            entry.last_used = time.monotonic()
+            try:
+                reply = await entry.session.send(message)
+            finally:
+                entry.last_used = time.monotonic()
+                entry.turns += 1
+            return {"session_id": session_id, "reply": reply, "events": entry.output.drain()}
+
+    def close(self, session_id: str) -> bool:
+        entry = self.sessions.pop(session_id, None)
+        if entry is None:
+            return False
+        if self.on_close:
+            self.on_close(session_id)
+        return True
+
+    def evict_idle(self) -> list:
+        """Close every session that has been idle longer than idle_timeout."""
+        cutoff = time.monotonic() - self.idle_timeout
+        idle = [
+            session_id
+            for session_id, entry in self.sessions.items()
+            if entry.last_used < cutoff and not entry.lock.locked()
+        ]
+        for session_id in idle:
+            self.close(session_id)
+        return idle
+
+    def _evict_oldest(self):
+        idle = [(entry.last_used, session_id) for session_id, entry in self.sessions.items() if not entry.lock.locked()]
+        if not idle:
+            raise RegistryFull(f"all {self.max_sessions} sessions are busy")
+        self.close(min(idle)[1])
+
+    def describe(self) -> list:
+        now = time.monotonic()
+        return [
+            {
+                "session_id": session_id,
+                "turns": entry.turns,
+                "busy": entry.lock.locked(),
+                "idle_s": round(now - entry.last_used, 1),
+                "age_s": round(now - entry.created, 1),
+            }
+            for session_id, entry in self.sessions.items()
+        ]
+
+    async def run_evictor(self, interval: float = 30):
+        while True:
+            await asyncio.sleep(interval)
+            evicted = self.evict_idle()
+            if evicted:
+                print(f"  [server] evicted {len(evicted)} idle session(s)")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "AgentServer"
+    registry = None  # set by serve()
+    loop = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _call(self, coro):
+        """Run a coroutine on the server's event loop and wait for it."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def _reply(self, status: int, body: dict):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _session_id(self):
+        match = re.fullmatch(r"/sessions(?:/([\w-]+))?/?", self.path)
+        if match is None:
+            self._reply(404, {"error": f"no route for {self.path}"})
+            return False
+        return match.group(1)
+
+    def do_GET(self):
+        session_id = self._session_id()
+        if session_id is False:
+            return
+
+        async def describe():
+            return self.registry.describe()
+
+        sessions = self._call(describe())
+        if session_id:
+            sessions = [s for s in sessions if s["session_id"] == session_id]
+            if not sessions:
+                return self._reply(404, {"error": f"no session {session_id}"})
+            return self._reply(200, sessions[0])
+        self._reply(200, {"sessions": sessions})
+
+    def do_POST(self):
+        session_id = self._session_id()
+        if session_id is False:
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            message = json.loads(self.rfile.read(length) or b"{}")["message"]
+        except (ValueError, KeyError, TypeError):
+            return self._reply(400, {"error": 'expected a JSON body {"message": "..."}'})
+
+        try:
+            result = self._call(self.registry.send(session_id, message))
+        except RegistryFull as e:
+            return self._reply(503, {"error": str(e)})
+        except Exception as e:
+            return self._reply(500, {"error": f"{type(e).__name__}: {e}"})
+        self._reply(200, result)
+
+    def do_DELETE(self):
+        session_id = self._session_id()
+        if session_id is False:
+            return
+        if not session_id:
+            return self._reply(400, {"error": "DELETE needs a session id"})
+
+        async def close():
+            return self.registry.close(session_id)
+
+        if self._call(close()):
+            return self._reply(200, {"closed": session_id})
+        self._reply(404, {"error": f"no session {session_id}"})
+
+
+def serve(provider, host: str = "127.0.0.1", port: int = 8000, idle_timeout: float = 900, max_sessions: int = 100):
+    """Start the event loop and HTTP server on background threads.
+
+    `provider` is a providers.Provider. Returns (http_server, loop,
+    registry); stop with shutdown().
+    """
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+
+    async def start():
+        # One client, hence one keep-alive connection pool, for every session
+        client = provider.make_client(http2=HTTP2)
+        registry = SessionRegistry(
+            lambda session_id, output: provider.make_session(session_id, output=output, client=client),
+            idle_timeout=idle_timeout,
+            max_sessions=max_sessions,
+            on_close=close_session,
+        )
+        registry.client = client
+        registry.evictor = asyncio.ensure_future(registry.run_evictor(min(30, idle_timeout)))
+        return registry
+
+    registry = asyncio.run_coroutine_threadsafe(start(), loop).result()
+    registry.watcher = start_watcher()  # keeps the shared caches in step with outside edits
+    handler = type("Handler", (_Handler,), {"registry": registry, "loop": loop})
+    http_server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=http_server.serve_forever, daemon=True).start()
+    return http_server, loop, registry
+
+
+def shutdown(http_server, loop, registry):
+    http_server.shutdown()
+
+    async def stop():
+        registry.evictor.cancel()
+        for session_id in list(registry.sessions):
+            registry.close(session_id)
+        await registry.client.close()
+
+    asyncio.run_coroutine_threadsafe(stop(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    stop_watcher(registry.watcher)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve many agent sessions from one process")
+    parser.add_argument("--provider", choices=["openai", "anthropic", "ollama"], help="model provider (default: $PROVIDER or openai)")
+    parser.add_argument("--anthropic", action="store_true", help="same as --provider anthropic")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--idle-timeout", type=float, default=900, help="evict sessions idle this long (s)")
+    parser.add_argument("--max-sessions", type=int, default=100, help="evict the least recently used idle session past this")
+    args = parser.parse_args()
+
+    if args.anthropic:
+        args.provider = "anthropic"
+    provider = get_provider(args.provider)
+
+    http_server, loop, registry = serve(provider, args.host, args.port, args.idle_timeout, args.max_sessions)
+    host, port = http_server.server_address[:2]
+    print(f"Agent server on http://{host}:{port} ({provider.name}, {'HTTP/2' if HTTP2 else 'HTTP/1.1'} to the provider)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        print("\nShutting down")
+    finally:
+        shutdown(http_server, loop, registry)
+        finish_tracing(tracer)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+"""
+The agent's tools and the workspace state behind them.
+
+Every provider adapter (providers.py) drives the same tools: they are
+registered here once, with their schemas built from their signatures
+(tool_registry.py), together with the caches they share (file contents,
+directory snapshots, the search index), the shell sessions and the
+workspace watcher. A speed-up to a tool therefore reaches every provider.
+"""
+
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from agent_core import current_session
+from bash_capture import format_output, run_bounded, run_bounded_async
+from fast_scan import scan_files
+from file_edits import EditError, EditTransaction, edit_file_atomic
+from file_ranges import head_tail, read_bytes, read_lines
+from file_tree import FileTree
+from prefetch import Prefetcher
+from read_cache import UNCHANGED_PREFIX, ReadCache
+from shell_sessions import SessionPool
+from tool_registry import ToolRegistry
+from trigram_index import get_index, mark_changed, set_trusted
+
+# --- Configuration ---
+TOOL_WORKERS = int(os.getenv("TOOL_WORKERS", "8"))
+SEARCH_INDEX = os.getenv("SEARCH_INDEX", "0") == "1"
+BASH_ECHO = os.getenv("BASH_ECHO", "0") == "1"
+BASH_SESSION = os.getenv("BASH_SESSION", "0") == "1"
+BASH_TIMEOUT = 30
+READ_CACHE_BYTES = int(os.getenv("READ_CACHE_BYTES", str(64 * 1024 * 1024)))
+READ_UNCHANGED = os.getenv("READ_UNCHANGED", "1") == "1"
+READ_MAX_BYTES = int(os.getenv("READ_MAX_BYTES", str(256 * 1024)))
+PREFETCH_BYTES = int(os.getenv("PREFETCH_BYTES", str(8 * 1024 * 1024)))
+LIST_DEPTH = int(os.getenv("LIST_DEPTH", "3"))
+WATCH = os.getenv("WATCH", "1")  # "1" inotify (off where unavailable), "poll", "0" off
+LIST_MAX_ENTRIES = int(os.getenv("LIST_MAX_ENTRIES", "1000"))
+
+SYSTEM_PROMPT = """You are a helpful coding assistant. You have access to tools that let you
+read, list, edit, and search files, and run bash commands. Use these tools to help the user
+with their coding tasks.
+
+Important rules:
+- Always read a file before editing it.
+- Use the tools available to you rather than guessing at file contents.
+- Explain what you're doing before and after making changes.
+- Be cautious with bash commands — never run destructive commands."""
+
+# --- Tools ---
+
+# Each tool is a function registered with @tools.tool, which builds its
+# schema from the signature (see tool_registry.py). Each provider asks the
+# registry for the schemas in its own format.
+tools = ToolRegistry()
+
+# Decoded file contents, checked against mtime/size/inode on every hit
+read_cache = ReadCache(READ_CACHE_BYTES)
+
+# Reads the files the model will likely ask for next into read_cache, in the background
+prefetcher = Prefetcher(read_cache, max_bytes=PREFETCH_BYTES, max_file_bytes=READ_MAX_BYTES)
+
+# Directory snapshots for list_files, checked against each directory's mtime
+file_tree = FileTree()
+
+
+@tools.tool(
+    "Read the contents of a file at the given path. Returns the file content as a string. Very large files return their first and last lines; use offset/limit or byte_offset/byte_limit to read other parts.",
+    read_only=True,
+    timeout=60,
+    params={
+        "path": "The path to the file to read",
+        "offset": "First line to read, 1-based (for large files)",
+        "limit": "Number of lines to read from offset (default 2000)",
+        "byte_offset": "Read from this byte instead of by line",
+        "byte_limit": "Number of bytes to read from byte_offset",
+    },
+)
+def read_file(path: str, offset: int = None, limit: int = None, byte_offset: int = None, byte_limit: int = None) -> str:
+    """Read and return the contents of a file, or one range of it."""
+    bounds = (("offset", offset, 1), ("limit", limit, 1), ("byte_offset", byte_offset, 0), ("byte_limit", byte_limit, 1))
+    for name, value, least in bounds:
+        if value is not None and value < least:
+            return f"Error: {name} must be {least} or more."
+    try:
+        if byte_offset is not None or byte_limit is not None:
+            return read_bytes(path, byte_offset or 0, min(byte_limit or READ_MAX_BYTES, READ_MAX_BYTES))
+        if offset is not None or limit is not None:
+            return read_lines(path, offset or 1, limit or 2000, READ_MAX_BYTES)
+        if os.path.getsize(path) > READ_MAX_BYTES:
+            return head_tail(path, READ_MAX_BYTES)
+        content, version = read_cache.read(path)
+    except Exception as e:
+        return f"Error reading file: {e}"
+    if READ_UNCHANGED and read_cache.already_seen(current_session.get(), path, version):
+        return f"{UNCHANGED_PREFIX}: {path} has not changed since you last read it; use that content.]"
+    return content
+
+
+@tools.tool(
+    "List files and directories at the given path. If no path is provided, lists the current directory. Set recursive to see a whole tree in one call.",
+    read_only=True,
+    timeout=60,
+    params={
+        "path": "The directory path to list (defaults to current directory)",
+        "recursive": "List subdirectories too, breadth-first, skipping files ignored by .gitignore. Paths are shown relative to path.",
+        "depth": "How many levels to list when recursive (default 3).",
+        "max_entries": "Stop after this many entries (default 1000).",
+    },
+)
+def list_files(path: str = ".", recursive: bool = False, depth: int = None, max_entries: int = None) -> str:
+    """List files and directories at the given path, or the tree under it."""
+    try:
+        return file_tree.listing(
+            path,
+            depth=(depth or LIST_DEPTH) if recursive else 1,
+            max_entries=max_entries or LIST_MAX_ENTRIES,
+            respect_ignore=recursive,
+        )
+    except Exception as e:
+        return f"Error listing files: {e}"
+
+
+@tools.tool(
+    "Edit a file by replacing an exact string match. The old_string must appear exactly once in the file. Read the file first to get the exact content. To make several changes to one file, pass them as edits.",
+    params={
+        "path": "The path to the file to edit",
+        "old_string": "The exact string to find and replace",
+        "new_string": "The string to replace it with",
+        "edits": {
+            "description": "Several replacements for this file, applied together in one pass instead of old_string/new_string. Each old_string is matched against the original content.",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "old_string": {"type": "string"},
+                    "new_string": {"type": "string"},
+                },
+                "required": ["old_string", "new_string"],
+            },
+        },
+    },
+)
+def edit_file(path: str, old_string: str = None, new_string: str = None, edits: list = None) -> str:
+    """Replace old_string with new_string in the file at path, or apply a
+    batch of such edits in one pass. The file is replaced atomically."""
+    if edits is None:
+        if old_string is None or new_string is None:
+            return "Error: give old_string and new_string, or a list of edits."
+        edits = [{"old_string": old_string, "new_string": new_string}]
+    try:
+        result = edit_file_atomic(path, [(e["old_string"], e["new_string"]) for e in edits], READ_MAX_BYTES)
+    except EditError as e:
+        return f"Error: {e}"
+    except Exception as e:
+        return f"Error editing file: {e}"
+
+    if result.text is not None:
+        read_cache.store(path, result.text)
+    else:
+        read_cache.invalidate(path)
+    if len(edits) == 1:
+        return "File edited successfully."
+    return f"File edited successfully ({result.replacements} edits)."
+
+
+@tools.tool(
+    "Apply many exact-string edits across one or more files in a single call, as one transaction: every edit is checked first, and if any fails to apply no file is changed. Use this for refactors that touch several places. Each old_string must appear exactly once in its file's original content.",
+    params={
+        "edits": {
+            "description": "The edits; several may target the same file",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "path": {"type": "string", "description": "The file to edit"},
+                    "old_string": {"type": "string", "description": "The exact string to find and replace"},
+                    "new_string": {"type": "string", "description": "The string to replace it with"},
+                },
+                "required": ["path", "old_string", "new_string"],
+            },
+        },
+    },
+)
+def apply_edits(edits: list) -> str:
+    """Apply edits across several files, all of them or none."""
+    if not edits:
+        return "Error: no edits given."
+    transaction = EditTransaction(READ_MAX_BYTES)
+    try:
+        for edit in edits:
+            transaction.add(edit["path"], edit["old_string"], edit["new_string"])
+        applied = transaction.apply()
+    except EditError as e:
+        return f"Error: {e} No files were changed."
+    except Exception as e:
+        return f"Error applying edits: {e}"
+
+    for path, result in applied:
+        if result.text is not None:
+            read_cache.store(path, result.text)
+        else:
+            read_cache.invalidate(path)
+    files = ", ".join(f"{path} ({result.replacements})" for path, result in applied)
+    return f"Applied {transaction.count} edits to {len(applied)} files: {files}"
+
+
+# Long-lived shells for BASH_SESSION=1, one per conversation
+shell_sessions = SessionPool()
+
+DANGEROUS_PATTERNS = ["rm -rf /", "rm -rf ~", "mkfs", "> /dev/sd", "dd if="]
+
+
+def is_dangerous(command: str) -> bool:
+    """Basic safety check for run_bash."""
+    return any(pattern in command for pattern in DANGEROUS_PATTERNS)
+
+
+async def run_bash_async(command: str) -> str:
+    """run_bash on an asyncio subprocess, so it does not hold a thread."""
+    if is_dangerous(command):
+        return "Error: refusing to run potentially destructive command."
+
+    try:
+        result = await run_bounded_async(command, timeout=BASH_TIMEOUT, echo=BASH_ECHO)
+    except Exception as e:
+        return f"Error running command: {e}"
+    return format_output(result, timeout=BASH_TIMEOUT)
+
+
+@tools.tool(
+    "Run a bash command and return its stdout and stderr. Use this for running tests, installing packages, or other shell operations. Do not use for destructive commands like rm -rf.",
+    timeout=BASH_TIMEOUT,
+    async_func=None if BASH_SESSION else run_bash_async,
+    params={
+        "command": "The bash command to execute",
+    },
+)
+def run_bash(command: str) -> str:
+    """Run a bash command with basic safety checks."""
+    if is_dangerous(command):
+        return "Error: refusing to run potentially destructive command."
+
+    try:
+        if BASH_SESSION:
+            result = shell_sessions.run(current_session.get(), command, timeout=BASH_TIMEOUT, echo=BASH_ECHO)
+        else:
+            result = run_bounded(command, timeout=BASH_TIMEOUT, echo=BASH_ECHO)
+    except Exception as e:
+        return f"Error running command: {e}"
+    return format_output(result, timeout=BASH_TIMEOUT)
+
+
+def walk_files(path: str):
+    """Yield the file paths under path that search_files looks at."""
+    for root, dirs, files in os.walk(path):
+        dirs[:] = [d for d in dirs if not d.startswith(".") and d not in ("node_modules", "__pycache__", "venv")]
+        for filename in files:
+            yield os.path.join(root, filename)
+
+
+@tools.tool(
+    "Search for a regex pattern across files in a directory. Returns matching lines with file paths and line numbers.",
+    read_only=True,
+    timeout=120,
+    params={
+        "pattern": "The regex pattern to search for",
+        "path": "The directory to search in (defaults to current directory)",
+    },
+)
+def search_files(pattern: str, path: str = ".") -> str:
+    """Search for a regex pattern in files under path."""
+    try:
+        regex = re.compile(pattern)
+    except re.error as e:
+        return f"Invalid regex pattern: {e}"
+
+    if SEARCH_INDEX:
+        filepaths = get_index(path, walk_files).candidates(regex)
+    else:
+        filepaths = walk_files(path)
+
+    matches = scan_files(filepaths, regex, limit=50)
+    if len(matches) >= 50:
+        matches.append("(truncated at 50 matches)")
+    return "\n".join(matches) if matches else "No matches found."
+
+
+def execute_tool(name: str, args: dict) -> str:
+    """Run a tool call in this thread: look it up, check its arguments, call it."""
+    return tools.call(name, args)
+
+
+# File tools block, so they run on a thread pool; read-only calls in one
+# turn run side by side (see tool_scheduler.py).
+tool_pool = ThreadPoolExecutor(max_workers=TOOL_WORKERS)
+
+
+async def execute_tool_async(name: str, args: dict) -> str:
+    """Run a tool without blocking the event loop."""
+    return await tools.run(name, args, tool_pool)
+
+
+def forget_dropped_read(name: str, args: dict):
+    """Compaction removed a file's content, so the next read must resend it."""
+    if name == "read_file":
+        read_cache.forget(current_session.get(), args.get("path", ""))
+
+
+def workspace_changed(path: str, is_dir: bool):
+    """The watcher saw path change: drop what the caches hold for it."""
+    read_cache.invalidate(path, tree=is_dir)
+    file_tree.invalidate(path, tree=is_dir)
+    mark_changed(path)
+
+
+def start_watcher(root: str = "."):
+    """Watch root for changes made outside the agent (None with WATCH=0).
+
+    The tree is walked on the watcher's thread, so this returns at once. Once
+    inotify covers a directory, the list_files tree and the search index trust
+    their entries for it instead of walking it again; until then they walk as
+    if nothing watched it. read_file always stats.
+    """
+    if WATCH == "0":
+        return None
+    from workspace_watch import Watcher  # ctypes and libc are only loaded when watching
+
+    watcher = Watcher(root, workspace_changed, force_poll=WATCH == "poll").start()
+    file_tree.trusted = watcher.covers
+    set_trusted(watcher.covers)
+    return watcher
+
+
+def stop_watcher(watcher):
+    if watcher is not None:
+        file_tree.trusted = None
+        set_trusted(None)
+        watcher.stop()
+
+
+def close_session(session_id: str):
+    """Release what a finished conversation holds outside its session object."""
+    shell_sessions.close(session_id)
+    read_cache.forget(session_id)
@@ -0,0 +1,206 @@
+"""
+Bounded, streaming output capture for run_bash.
+
+`subprocess.run(capture_output=True)` holds everything a command prints in
+memory and hands all of it to the model. Here stdout and stderr are read
+as streams into head/tail buffers with a byte budget: the start and end of
+the output are kept, the middle is counted and dropped. A command that
+keeps producing output past a hard limit is killed, and background children
+still holding the pipes open are left behind once the command exits.
+"""
+
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+OUTPUT_BUDGET = int(os.getenv("BASH_OUTPUT_BYTES", str(32 * 1024)))  # per stream
+KILL_AFTER_BYTES = int(os.getenv("BASH_KILL_BYTES", str(64 * 1024 * 1024)))
+DRAIN_SECONDS = 1.0  # how long to wait for pipes after the command exits
+READ_SIZE = 64 * 1024
+
+
+class HeadTailBuffer:
+    """Keeps the first and last `budget / 2` bytes written and counts the rest."""
+
+    def __init__(self, budget: int = OUTPUT_BUDGET):
+        self.head_limit = budget // 2
+        self.tail_limit = budget - self.head_limit
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.total = 0
+
+    def write(self, data: bytes):
+        self.total += len(data)
+        room = self.head_limit - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+        if data:
+            self.tail += data
+            if len(self.tail) > self.tail_limit:
+                del self.tail[: len(self.tail) - self.tail_limit]
+
+    @property
+    def dropped(self) -> int:
+        return self.total - len(self.head) - len(self.tail)
+
+    def text(self) -> str:
+        head = self.head.decode("utf-8", errors="replace")
+        tail = self.tail.decode("utf-8", errors="replace")
+        if not self.dropped:
+            return head + tail
+        return f"{head}\n[... {self.dropped:,} bytes dropped ...]\n{tail}"
+
+
+class BoundedResult:
+    """Outcome of run_bounded()."""
+
+    def __init__(self, stdout, stderr, returncode, timed_out, killed):
+        self.stdout = stdout
+        self.stderr = stderr
+        self.returncode = returncode
+        self.timed_out = timed_out
+        self.killed = killed
+
+
+def _kill_group(proc):
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def run_bounded(command: str, timeout: float = 30, budget: int = OUTPUT_BUDGET, echo: bool = False) -> BoundedResult:
+    """Run a shell command, capturing at most budget bytes of each stream."""
+    proc = subprocess.Popen(
+        command,
+        shell=True,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        start_new_session=True,  # so the whole process group can be killed
+    )
+    buffers = {"stdout": HeadTailBuffer(budget), "stderr": HeadTailBuffer(budget)}
+    killed = threading.Event()
+
+    def pump(pipe, buffer, echo_to):
+        fd = pipe.fileno()
+        while True:
+            data = os.read(fd, READ_SIZE)
+            if not data:
+                break
+            buffer.write(data)
+            if echo_to is not None:
+                echo_to.buffer.write(data)
+                echo_to.flush()
+            if buffers["stdout"].total + buffers["stderr"].total > KILL_AFTER_BYTES and not killed.is_set():
+                killed.set()
+                _kill_group(proc)
+        pipe.close()
+
+    readers = [
+        threading.Thread(target=pump, args=(proc.stdout, buffers["stdout"], sys.stdout if echo else None), daemon=True),
+        threading.Thread(target=pump, args=(proc.stderr, buffers["stderr"], sys.stderr if echo else None), daemon=True),
+    ]
+    for reader in readers:
+        reader.start()
+
+    timed_out = False
+    try:
+        proc.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        timed_out = True
+        _kill_group(proc)
+        proc.wait()
+
+    # Background children may keep the pipes open; don't wait on them forever
+    deadline = time.monotonic() + DRAIN_SECONDS
+    for reader in readers:
+        reader.join(max(0, deadline - time.monotonic()))
+
+    return BoundedResult(
+        buffers["stdout"].text(),
+        buffers["stderr"].text(),
+        proc.returncode,
+        timed_out,
+        killed.is_set(),
+    )
+
+
+async def run_bounded_async(command: str, timeout: float = 30, budget: int = OUTPUT_BUDGET, echo: bool = False) -> BoundedResult:
+    """run_bounded() on an asyncio subprocess, without tying up a thread."""
+    proc = await asyncio.create_subprocess_shell(
+        command,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        start_new_session=True,
+    )
+    buffers = {"stdout": HeadTailBuffer(budget), "stderr": HeadTailBuffer(budget)}
+    killed = False
+
+    async def pump(stream, buffer, echo_to):
+        nonlocal killed
+        while True:
+            data = await stream.read(READ_SIZE)
+            if not data:
+                break
+            buffer.write(data)
+            if echo_to is not None:
+                echo_to.buffer.write(data)
+                echo_to.flush()
+            if buffers["stdout"].total + buffers["stderr"].total > KILL_AFTER_BYTES and not killed:
+                killed = True
+                _kill_group(proc)
+
+    readers = [
+        asyncio.ensure_future(pump(proc.stdout, buffers["stdout"], sys.stdout if echo else None)),
+        asyncio.ensure_future(pump(proc.stderr, buffers["stderr"], sys.stderr if echo else None)),
+    ]
+
+    timed_out = False
+    try:
+        await asyncio.wait_for(proc.wait(), timeout)
+    except asyncio.TimeoutError:
+        timed_out = True
+        _kill_group(proc)
+        await proc.wait()
+    except asyncio.CancelledError:  # the turn was abandoned: don't leave the command running
+        _kill_group(proc)
+        for reader in readers:
+            reader.cancel()
+        raise
+
+    # Background children may keep the pipes open; don't wait on them forever
+    _, still_reading = await asyncio.wait(readers, timeout=DRAIN_SECONDS)
+    for reader in still_reading:
+        reader.cancel()
+
+    return BoundedResult(
+        buffers["stdout"].text(),
+        buffers["stderr"].text(),
+        proc.returncode,
+        timed_out,
+        killed,
+    )
+
+
+def format_output(result: BoundedResult, timeout: float = 30) -> str:
+    """Format a result the way run_bash always has: stdout, then STDERR."""
+    output = ""
+    if result.stdout:
+        output += result.stdout
+    if result.stderr:
+        output += ("" if not output else "\n") + f"STDERR: {result.stderr}"
+    if result.timed_out:
+        note = f"Error: command timed out after {timeout:g} seconds."
+        return note if not output else f"{note}\n{output}"
+    if result.killed:
+        output += f"\n[killed: output passed {KILL_AFTER_BYTES:,} bytes]"
+    if not output:
+        output = "(no output)"
+    return output
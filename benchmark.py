@@ -0,0 +1,318 @@
+"""
+Offline benchmark for the agent.
+
+Runs agent sessions (the OpenAI provider) against the scripted mock server
+in mock_llm.py, on a set of coding tasks in a throwaway workspace. Needs no
+network and no API key. For each task it reports per-turn latency, the time
+spent in model calls versus tool calls, prompt tokens sent and peak Python
+memory.
+
+It also times start-up in fresh interpreters: solution.py's main(), with the
+workspace watcher and the default environment, must reach its first prompt
+within --startup-budget seconds and must not import an SDK on the way (the
+REPL imports it in the background while the user types).
+
+Usage:
+  python benchmark.py                       # built-in tasks
+  python benchmark.py --stream              # same, with STREAM=1
+  python benchmark.py --latency 0.2         # simulate a slower model
+  python benchmark.py --tasks tasks.json    # scripted or recorded tasks
+  python benchmark.py --save base.json      # keep the results
+  python benchmark.py --baseline base.json  # exit 1 on a regression
+  python benchmark.py --record replies/     # record model replies...
+  python benchmark.py --replay replies/     # ...and time the agent on exact replays
+  python benchmark.py --startup-budget 0.3  # stricter start-up check (default 0.5s)
+
+A task file is a JSON list of {"name", "files", "prompts", "replies"}; see
+BUILTIN_TASKS below for the shape.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from mock_llm import MockLLM, serve
+
+
+def _module(name: str, functions: int) -> str:
+    lines = [f'"""The {name} module."""', "", "import os", ""]
+    for i in range(functions):
+        lines += ["", f"def {name}_helper_{i}(value):", f'    """Helper {i}."""', f"    return value * {i}", ""]
+    return "\n".join(lines)
+
+
+BUILTIN_TASKS = [
+    {
+        "name": "explore",
+        "files": {
+            "app/models.py": _module("models", 40),
+            "app/views.py": _module("views", 40),
+            "app/config.py": _module("config", 10) + "\n\ndef load_config(path):\n    return {}\n",
+            "README.md": "# Demo app\n",
+        },
+        "prompts": ["Where is load_config defined and who uses the models?"],
+        "replies": [
+            {"tool_calls": [["list_files", {"path": "."}], ["list_files", {"path": "app"}]]},
+            {"tool_calls": [["search_files", {"pattern": "def load_config", "path": "."}]]},
+            {
+                "tool_calls": [
+                    ["read_file", {"path": "app/config.py"}],
+                    ["read_file", {"path": "app/models.py"}],
+                    ["read_file", {"path": "app/views.py"}],
+                ]
+            },
+            {"text": "load_config is defined in app/config.py; nothing imports the models yet."},
+        ],
+    },
+    {
+        "name": "edit",
+        "files": {"app/utils.py": "def helper(x):\n    return x + 1\n"},
+        "prompts": ["Rename helper to increment and check the module still imports."],
+        "replies": [
+            {"tool_calls": [["read_file", {"path": "app/utils.py"}]]},
+            {"tool_calls": [["edit_file", {"path": "app/utils.py", "old_string": "def helper", "new_string": "def increment"}]]},
+            {"tool_calls": [["run_bash", {"command": "python -c 'import app.utils as u; print(u.increment(1))'"}]]},
+            {"text": "Renamed helper to increment; the module imports and increment(1) == 2."},
+        ],
+    },
+    {
+        "name": "long_session",
+        "files": {f"src/module_{i}.py": _module(f"module_{i}", 200) for i in range(8)},
+        "prompts": [f"Summarise src/module_{i}.py" for i in range(8)],
+        "replies": [
+            reply
+            for i in range(8)
+            for reply in (
+                {"tool_calls": [["read_file", {"path": f"src/module_{i}.py"}]]},
+                {"tool_calls": [["search_files", {"pattern": f"def module_{i}_helper_1\\d", "path": "src"}]]},
+                {"text": f"module_{i} defines 200 numbered helpers."},
+            )
+        ],
+    },
+]
+
+
+def write_workspace(root: str, files: dict):
+    for path, content in files.items():
+        full = os.path.join(root, path)
+        os.makedirs(os.path.dirname(full), exist_ok=True)
+        with open(full, "w") as f:
+            f.write(content)
+
+
+def run_task(provider, mock: MockLLM, task: dict, trace_memory: bool = False) -> dict:
+    """Run one task in a fresh workspace and return its measurements.
+
+    tracemalloc slows allocation-heavy code (SDK response parsing) several
+    times over, so memory is measured on a separate run from timings.
+    """
+    tool_seconds = 0.0
+
+    def on_span(span, args):
+        nonlocal tool_seconds
+        if span.kind == "tool":
+            tool_seconds += span.duration
+
+    async def run(session):
+        turn_seconds = []
+        for prompt in task["prompts"]:
+            start = time.perf_counter()
+            await session.send(prompt)
+            turn_seconds.append(time.perf_counter() - start)
+        await session.client.close()
+        return turn_seconds
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workspace:
+        write_workspace(workspace, task["files"])
+        os.chdir(workspace)
+        mock.reset()
+        mock.load(task["replies"])
+
+        peak = 0
+        if trace_memory:
+            tracemalloc.start()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                turn_seconds = asyncio.run(run(provider.make_session(on_span=on_span)))
+            if trace_memory:
+                _, peak = tracemalloc.get_traced_memory()
+        finally:
+            if trace_memory:
+                tracemalloc.stop()
+            os.chdir(cwd)
+
+    return {
+        "turns": len(turn_seconds),
+        "model_calls": mock.requests,
+        "turn_mean_s": sum(turn_seconds) / len(turn_seconds),
+        "turn_max_s": max(turn_seconds),
+        "total_s": sum(turn_seconds),
+        "model_s": mock.request_seconds,
+        "tools_s": tool_seconds,
+        "prompt_tokens": mock.prompt_tokens,
+        "peak_mem_mb": peak / 1024 / 1024,
+    }
+
+
+STARTUP_SCRIPT = """
+import builtins, json, sys, time
+start = time.perf_counter()
+import solution
+imported = time.perf_counter()
+sample = {"import_s": imported - start}
+warm_up = solution.provider.warm_up
+
+def recorded_warm_up():
+    sample["sdks"] = [name for name in ("openai", "anthropic", "httpx", "pydantic") if name in sys.modules]
+    warm_up()
+
+def first_prompt(prompt=""):
+    sample["prompt_s"] = time.perf_counter() - imported
+    raise EOFError
+
+solution.provider.warm_up = recorded_warm_up
+builtins.input = first_prompt
+solution.main()
+print(json.dumps(sample))
+"""
+
+
+def measure_startup(runs: int = 5) -> dict:
+    """Best of `runs` fresh interpreters: time from starting solution.py to its first prompt.
+
+    This runs the REPL's own main() in the current directory with the
+    caller's environment, watcher and all, and answers the prompt with
+    end-of-file. Run the benchmark from a large tree to time start-up there.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [here, os.getenv("PYTHONPATH")])))
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", STARTUP_SCRIPT],
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        samples.append(json.loads(out.splitlines()[-1]))  # after the REPL's own output
+    return min(samples, key=lambda sample: sample["import_s"] + sample["prompt_s"])
+
+
+def check_startup(startup: dict, budget: float) -> list:
+    """Return a description of every way start-up broke its budget."""
+    problems = []
+    total = startup["import_s"] + startup["prompt_s"]
+    if total > budget:
+        problems.append(f"start-up took {total:.3f}s (budget {budget:.3f}s)")
+    if startup["sdks"]:
+        problems.append(f"{', '.join(startup['sdks'])} imported before the REPL started warming up")
+    return problems
+
+
+def print_table(results: dict):
+    header = f"{'task':<14}{'turns':>6}{'calls':>6}{'turn avg':>10}{'turn max':>10}{'model':>9}{'tools':>9}{'tokens':>10}{'mem MB':>8}"
+    print(header)
+    print("-" * len(header))
+    for name, r in results.items():
+        print(
+            f"{name:<14}{r['turns']:>6}{r['model_calls']:>6}"
+            f"{r['turn_mean_s']:>9.3f}s{r['turn_max_s']:>9.3f}s"
+            f"{r['model_s']:>8.3f}s{r['tools_s']:>8.3f}s"
+            f"{r['prompt_tokens']:>10,}{r['peak_mem_mb']:>8.1f}"
+        )
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Return a description of every metric that got worse than baseline allows."""
+    regressions = []
+    for name, r in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        for metric in ("turn_mean_s", "prompt_tokens", "peak_mem_mb"):
+            if r[metric] > base[metric] * (1 + tolerance):
+                regressions.append(f"{name}.{metric}: {base[metric]:.3f} -> {r[metric]:.3f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline agent benchmark")
+    parser.add_argument("--tasks", help="JSON file of scripted tasks (default: built-in tasks)")
+    parser.add_argument("--stream", action="store_true", help="benchmark STREAM=1")
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated model latency per call (s)")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="delay between streamed chunks (s)")
+    parser.add_argument("--save", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="compare against results saved with --save")
+    parser.add_argument("--record", metavar="DIR", help="record model replies into DIR (LLM_CACHE=1)")
+    parser.add_argument("--replay", metavar="DIR", help="replay replies recorded in DIR instead of calling the model")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown vs baseline (0.25 = 25%%)")
+    parser.add_argument("--startup-budget", type=float, default=0.5, help="max seconds from starting solution.py to its first prompt")
+    args = parser.parse_args()
+
+    tasks = BUILTIN_TASKS
+    if args.tasks:
+        with open(args.tasks) as f:
+            tasks = json.load(f)
+
+    mock = MockLLM(latency=args.latency, token_delay=args.token_delay)
+    server, base_url = serve(mock)
+    os.environ["PROVIDER"] = "openai"  # the mock speaks the OpenAI API
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ["OPENAI_API_KEY"] = "benchmark"
+    os.environ["MODEL"] = "mock"
+    os.environ["STREAM"] = "1" if args.stream else "0"
+    if args.record or args.replay:
+        os.environ["LLM_CACHE"] = "1" if args.record else "replay"
+        os.environ["LLM_CACHE_DIR"] = args.record or args.replay
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from agent_tools import prefetcher  # after the environment above, which the modules read at import
+    from providers import get_provider
+
+    provider = get_provider()
+    # The first task should time the agent, not the SDK's one-off import and set-up; start-up is measured below
+    provider.make_client()
+
+    results = {}
+    for task in tasks:
+        results[task["name"]] = run_task(provider, mock, task)
+        memory_run = run_task(provider, mock, task, trace_memory=True)
+        results[task["name"]]["peak_mem_mb"] = memory_run["peak_mem_mb"]
+    server.shutdown()
+    print_table(results)
+    print(f"\nprefetch: {prefetcher.summary()}")
+    startup = measure_startup()
+    print(f"start-up: import {startup['import_s']:.3f}s, first prompt {startup['prompt_s']:.3f}s later")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nRegressions:")
+            for line in regressions:
+                print(f"  {line}")
+            return False
+        print("\nNo regressions against baseline.")
+    problems = check_startup(startup, args.startup_budget)
+    if problems:
+        print("\nStart-up over budget:")
+        for line in problems:
+            print(f"  {line}")
+        return False
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
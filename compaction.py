@@ -0,0 +1,220 @@
+"""
+Context compaction for the messages list.
+
+Every tool result stays in `messages` and is re-sent on every request, so
+cost and latency grow each turn. Before a model call, `compact()` checks the
+history against a token budget and, oldest first:
+
+  1. replaces file reads that were superseded by a later identical read,
+  2. trims large old tool results to their first and last lines,
+  3. drops old tool results entirely if that is still not enough.
+
+The system prompt and user prompts are never touched, and neither are the
+tool results of the last two user turns, unless those turns hold more than
+the last few tool rounds: one long prompt (a batch task, say) can run
+dozens of rounds, and everything before its most recent rounds is fair
+game. Once over budget, it compacts down to `target` of the budget, not
+just under it, so that the next few calls leave the history, and with it
+the provider's prompt-cache prefix, alone. Works with both the OpenAI
+(`role: tool`) and Anthropic (`tool_result`) shapes.
+
+A read_file result of "[unchanged since your last read ...]" points back at
+an earlier read, so it never supersedes it. Callers that track what the
+model has seen can pass `on_drop`, which is told about every result that is
+trimmed or removed.
+"""
+
+import json
+
+CHARS_PER_TOKEN = 4
+UNCHANGED_PREFIX = "[unchanged since your last read"
+TRIM_HEAD_LINES = 20
+TRIM_TAIL_LINES = 10
+TARGET = 0.7  # compact down to this share of the budget
+
+
+def _get(obj, key, default=None):
+    """Read a field from a dict or an SDK object."""
+    if isinstance(obj, dict):
+        return obj.get(key, default)
+    return getattr(obj, key, default)
+
+
+def _text_chars(content) -> int:
+    if content is None:
+        return 0
+    if isinstance(content, str):
+        return len(content)
+    if isinstance(content, list):
+        return sum(_block_chars(block) for block in content)
+    return len(str(content))
+
+
+def _block_chars(block) -> int:
+    kind = _get(block, "type")
+    if kind == "text":
+        return len(_get(block, "text", ""))
+    if kind == "tool_use":
+        return len(_get(block, "name", "")) + len(json.dumps(_get(block, "input", {})))
+    if kind == "tool_result":
+        return _text_chars(_get(block, "content"))
+    return len(str(block))
+
+
+def estimate_tokens(messages) -> int:
+    """Rough token count of a message list (about 4 characters per token)."""
+    chars = 0
+    for msg in messages:
+        chars += _text_chars(_get(msg, "content"))
+        for call in _get(msg, "tool_calls") or []:
+            function = _get(call, "function")
+            chars += len(_get(function, "name", "")) + len(_get(function, "arguments", ""))
+    return chars // CHARS_PER_TOKEN
+
+
+# --- Finding tool results ---
+
+
+def _is_user_prompt(msg) -> bool:
+    """A user message typed by the user, not a batch of tool results."""
+    return _get(msg, "role") == "user" and isinstance(_get(msg, "content"), str)
+
+
+def _tool_calls(messages) -> dict:
+    """Map tool call id -> (tool name, args) for both message formats."""
+    calls = {}
+    for msg in messages:
+        if _get(msg, "role") != "assistant":
+            continue
+        for call in _get(msg, "tool_calls") or []:
+            function = _get(call, "function")
+            try:
+                args = json.loads(_get(function, "arguments") or "{}")
+            except json.JSONDecodeError:
+                args = {}
+            calls[_get(call, "id")] = (_get(function, "name"), args)
+        content = _get(msg, "content")
+        if isinstance(content, list):
+            for block in content:
+                if _get(block, "type") == "tool_use":
+                    calls[_get(block, "id")] = (_get(block, "name"), _get(block, "input") or {})
+    return calls
+
+
+def _tool_results(messages):
+    """Yield (index, holder, key, call_id) for every tool result.
+
+    `holder[key]` is the result text, so it can be replaced in place.
+    """
+    for index, msg in enumerate(messages):
+        if not isinstance(msg, dict):
+            continue
+        if msg.get("role") == "tool":
+            yield index, msg, "content", msg.get("tool_call_id")
+        elif msg.get("role") == "user" and isinstance(msg.get("content"), list):
+            for block in msg["content"]:
+                if isinstance(block, dict) and block.get("type") == "tool_result":
+                    yield index, block, "content", block.get("tool_use_id")
+
+
+def _is_tool_round(msg) -> bool:
+    """An assistant message that calls tools."""
+    if _get(msg, "role") != "assistant":
+        return False
+    if _get(msg, "tool_calls"):
+        return True
+    content = _get(msg, "content")
+    return isinstance(content, list) and any(_get(block, "type") == "tool_use" for block in content)
+
+
+def _protected_from(messages, keep_recent_turns: int, keep_recent_rounds: int) -> int:
+    """Index of the first message that must be kept exactly.
+
+    That is the start of the last keep_recent_turns user turns, or of the
+    last keep_recent_rounds tool rounds if those begin later.
+    """
+    prompts = [i for i, msg in enumerate(messages) if _is_user_prompt(msg)]
+    if len(prompts) <= keep_recent_turns:
+        by_turns = prompts[0] if prompts else len(messages)
+    else:
+        by_turns = prompts[-keep_recent_turns]
+    rounds = [i for i, msg in enumerate(messages) if _is_tool_round(msg)]
+    by_rounds = rounds[-keep_recent_rounds] if len(rounds) >= keep_recent_rounds else 0
+    return max(by_turns, by_rounds)
+
+
+def _trimmed(text: str) -> str:
+    lines = text.splitlines()
+    if len(lines) <= TRIM_HEAD_LINES + TRIM_TAIL_LINES:
+        return text
+    dropped = len(lines) - TRIM_HEAD_LINES - TRIM_TAIL_LINES
+    return "\n".join(
+        lines[:TRIM_HEAD_LINES]
+        + [f"[... {dropped} lines compacted to save context; re-run the tool if you need them ...]"]
+        + lines[-TRIM_TAIL_LINES:]
+    )
+
+
+# --- Compaction ---
+
+
+def compact(
+    messages: list,
+    budget: int,
+    keep_recent_turns: int = 2,
+    keep_recent_rounds: int = 2,
+    on_drop=None,
+    target: float = TARGET,
+) -> int:
+    """Shrink old tool results in place once messages pass budget tokens,
+    until they fit in target * budget.
+
+    `on_drop(name, args)` is called for each tool result that loses content.
+    Returns the number of tokens saved (0 if nothing was changed).
+    """
+    before = estimate_tokens(messages)
+    if before <= budget:
+        return 0
+    goal = int(budget * target)
+
+    protected = _protected_from(messages, keep_recent_turns, keep_recent_rounds)
+    calls = _tool_calls(messages)
+    results = list(_tool_results(messages))
+    old = [r for r in results if r[0] < protected and isinstance(r[1][r[2]], str)]
+    tokens = before
+
+    def replace(holder, key, text, call_id=None):
+        nonlocal tokens
+        if text == holder[key]:
+            return
+        tokens -= (len(holder[key]) - len(text)) // CHARS_PER_TOKEN
+        holder[key] = text
+        if on_drop is not None and call_id is not None:
+            on_drop(*calls.get(call_id, (None, {})))
+
+    # 1. A read of a file (or of the same range of it) that was repeated later is stale
+    last_read = {}
+    for index, holder, key, call_id in results:
+        name, args = calls.get(call_id, (None, {}))
+        if name == "read_file" and not str(holder[key]).startswith(UNCHANGED_PREFIX):
+            last_read[json.dumps(args, sort_keys=True)] = index
+    for index, holder, key, call_id in old:
+        name, args = calls.get(call_id, (None, {}))
+        if name == "read_file" and last_read.get(json.dumps(args, sort_keys=True), index) > index:
+            replace(holder, key, f"[superseded: {args.get('path')} was read again later in the conversation]")
+
+    # 2. Trim large results to head and tail, oldest first
+    for index, holder, key, call_id in old:
+        if tokens <= goal:
+            break
+        replace(holder, key, _trimmed(holder[key]), call_id)
+
+    # 3. Still too big: drop old results entirely
+    for index, holder, key, call_id in old:
+        if tokens <= goal:
+            break
+        if not holder[key].startswith("[superseded") and not holder[key].startswith("[removed"):
+            name, _ = calls.get(call_id, ("tool", {}))
+            replace(holder, key, f"[removed to save context: old {name} result]", call_id)
+
+    return max(before - estimate_tokens(messages), 0)
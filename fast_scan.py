@@ -0,0 +1,176 @@
+"""
+Parallel, mmap-based file scanning for search_files.
+
+Each file is memory-mapped and the compiled regex runs over the whole
+buffer; line numbers are only worked out for the lines that match. Files
+that look binary (a NUL byte near the start) are skipped. Large trees are
+split into chunks and spread across a process pool, and no more chunks are
+handed out once enough matches have been found.
+
+The output is the same as scanning the file line by line: one entry per
+matching line, in file order.
+"""
+
+import locale
+import mmap
+import os
+import re
+import threading
+from itertools import chain
+
+SNIFF_BYTES = 8192
+CHUNK_FILES = 32
+PARALLEL_MIN_FILES = 256  # below this a process pool costs more than it saves
+WORKERS = int(os.getenv("SEARCH_PROCESSES", str(os.cpu_count() or 1)))
+
+# Patterns that can look at the end of the line string (or past it) may
+# match differently inside a larger buffer. They are matched line by line.
+_LINE_ONLY = ("$", "\\A", "\\Z", "\\B", "\\n", "(?=", "(?!", "(?<=", "(?<!")
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # multiprocessing is slow to import and small trees never need it
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            # Forking copies the locks other threads (tools, watcher, prefetch) hold at that moment;
+            # a fork server starts each worker from a clean single-threaded process instead
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _pool = ProcessPoolExecutor(max_workers=WORKERS, mp_context=multiprocessing.get_context(method))
+        return _pool
+
+
+def _read_text(filepath: str):
+    """Map a file and decode it like a text-mode read. None if binary or empty."""
+    with open(filepath, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if b"\0" in mm[:SNIFF_BYTES]:
+                return None
+            text = str(mm, locale.getpreferredencoding(False), "ignore")
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
+
+
+def _scan_buffer(text, regex, buffer_regex, limit):
+    """Yield (line_number, line) for matching lines, searching the whole buffer."""
+    found = 0
+    pos = 0
+    lineno = 1
+    counted_to = 0
+    while found < limit:
+        m = buffer_regex.search(text, pos)
+        if not m:
+            return
+        start = text.rfind("\n", 0, m.start()) + 1
+        if start >= len(text):
+            return  # an empty match after the final newline is not a line
+        end = text.find("\n", m.start())
+        end = len(text) if end == -1 else end + 1
+        line = text[start:end]
+
+        # A buffer match can run across lines, so confirm it on the line alone
+        if regex.search(line):
+            lineno += text.count("\n", counted_to, start)
+            counted_to = start
+            yield lineno, line
+            found += 1
+        pos = end
+        if pos >= len(text):
+            return
+
+
+def _scan_lines(text, regex, limit):
+    """Yield (line_number, line) for matching lines, one line at a time."""
+    found = 0
+    lines = text.split("\n")
+    ends_with_newline = not lines[-1]
+    if ends_with_newline:
+        lines.pop()
+    for i, line in enumerate(lines, 1):
+        if i < len(lines) or ends_with_newline:
+            line += "\n"
+        if regex.search(line):
+            yield i, line
+            found += 1
+            if found >= limit:
+                return
+
+
+def scan_chunk(filepaths, pattern, flags, limit) -> list:
+    """Scan files in order and return up to limit "path:line: text" matches."""
+    regex = re.compile(pattern, flags)
+    buffer_regex = None
+    if not any(token in pattern for token in _LINE_ONLY):
+        buffer_regex = re.compile(pattern, flags | re.MULTILINE)
+
+    matches = []
+    for filepath in filepaths:
+        try:
+            text = _read_text(filepath)
+        except (OSError, ValueError):
+            continue
+        if text is None:
+            continue
+        remaining = limit - len(matches)
+        if buffer_regex is not None:
+            hits = _scan_buffer(text, regex, buffer_regex, remaining)
+        else:
+            hits = _scan_lines(text, regex, remaining)
+        for i, line in hits:
+            matches.append(f"{filepath}:{i}: {line.rstrip()}")
+        if len(matches) >= limit:
+            break
+    return matches
+
+
+def _chunks(filepaths):
+    chunk = []
+    for filepath in filepaths:
+        chunk.append(filepath)
+        if len(chunk) >= CHUNK_FILES:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def scan_files(filepaths, regex, limit: int = 50) -> list:
+    """Return up to limit matches for regex across filepaths, in order."""
+    filepaths = iter(filepaths)
+    head = []
+    for filepath in filepaths:
+        head.append(filepath)
+        if len(head) >= PARALLEL_MIN_FILES:
+            break
+    if len(head) < PARALLEL_MIN_FILES or WORKERS <= 1:
+        head.extend(filepaths)
+        return scan_chunk(head, regex.pattern, regex.flags, limit)
+
+    pool = _get_pool()
+    chunks = _chunks(chain(head, filepaths))
+    in_flight = []
+    matches = []
+
+    def submit_next():
+        chunk = next(chunks, None)
+        if chunk is not None:
+            in_flight.append(pool.submit(scan_chunk, chunk, regex.pattern, regex.flags, limit))
+
+    for _ in range(WORKERS * 2):
+        submit_next()
+    # Results are consumed in submission order so matches keep walk order
+    while in_flight and len(matches) < limit:
+        matches.extend(in_flight.pop(0).result())
+        submit_next()
+    for future in in_flight:
+        future.cancel()
+    return matches[:limit]
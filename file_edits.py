@@ -0,0 +1,220 @@
+"""
+Atomic, single-pass edits for edit_file.
+
+The file is memory-mapped and each old_string is found with one forward
+scan (a second search only to confirm it is unique), so the file is never
+decoded or copied into a Python string. The edited file is streamed into a
+temporary file in the same directory, which then replaces the original with
+an atomic rename: a crash leaves either the old file or the new one, never
+half of each. Permissions are kept, and symlinks are edited through.
+
+Several edits to one file are applied in the same pass. They are all
+matched against the original content, must each match exactly once and
+must not overlap.
+
+EditTransaction applies edits across many files as a unit: every file is
+checked and written to its temp file first, and if swapping any of them in
+fails, the files already swapped are restored from hard-linked backups.
+"""
+
+import locale
+import mmap
+import os
+import stat
+import tempfile
+
+
+class EditError(Exception):
+    """An edit that cannot be applied; the message is shown to the model."""
+
+
+def _count(mm, needle: bytes) -> int:
+    count, pos = 0, mm.find(needle)
+    while pos >= 0:
+        count += 1
+        pos = mm.find(needle, pos + len(needle))
+    return count
+
+
+def _locate(mm, needle: bytes, label: str) -> int:
+    """Offset of the one occurrence of needle, or EditError."""
+    start = mm.find(needle)
+    if start < 0:
+        raise EditError(f"{label}old_string not found in file.")
+    if mm.find(needle, start + len(needle)) >= 0:
+        raise EditError(f"{label}old_string appears {_count(mm, needle)} times. Provide a more unique string.")
+    return start
+
+
+class PreparedEdit:
+    """An edited copy of a file, written to a temp file but not yet swapped in.
+
+    `commit()` renames it over the original; `discard()` throws it away.
+    `text` is the new content when it was small enough to keep, else None.
+    """
+
+    def __init__(self, path: str, temp_path: str, replacements: int, size: int, text):
+        self.path = path
+        self.temp_path = temp_path
+        self.replacements = replacements
+        self.size = size
+        self.text = text
+
+    def commit(self):
+        os.replace(self.temp_path, self.path)
+        self.temp_path = None
+
+    def discard(self):
+        if self.temp_path is not None:
+            try:
+                os.unlink(self.temp_path)
+            except FileNotFoundError:
+                pass
+            self.temp_path = None
+
+
+def prepare_edits(path: str, edits: list, keep_text_bytes: int = 0, numbers=None) -> PreparedEdit:
+    """Match (old_string, new_string) edits against path and write the result
+    to a temp file. Raises EditError (nothing written) if any edit fails.
+
+    `numbers` are the edits' positions to use in error messages.
+    """
+    if not edits:
+        raise EditError("no edits given.")
+    path = os.path.realpath(path)
+    encoding = locale.getpreferredencoding(False)
+
+    with open(path, "rb") as f:
+        st = os.fstat(f.fileno())
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if st.st_size else b""
+        try:
+            # Text-mode reads show CRLF files with "\n"; match them the same way
+            first_newline = mm.find(b"\n")
+            crlf = first_newline > 0 and mm[first_newline - 1 : first_newline] == b"\r"
+
+            spans = []
+            for number, (old_string, new_string) in zip(numbers or range(1, len(edits) + 1), edits):
+                label = f"edit {number}: " if numbers or len(edits) > 1 else ""
+                if not old_string:
+                    raise EditError(f"{label}old_string is empty.")
+                if crlf:
+                    old_string = old_string.replace("\r\n", "\n").replace("\n", "\r\n")
+                    new_string = new_string.replace("\r\n", "\n").replace("\n", "\r\n")
+                old, new = old_string.encode(encoding), new_string.encode(encoding)
+                start = _locate(mm, old, label)
+                spans.append((start, start + len(old), new, number))
+
+            spans.sort()
+            for (_, end, _, a), (start, _, _, b) in zip(spans, spans[1:]):
+                if start < end:
+                    raise EditError(f"edits {min(a, b)} and {max(a, b)} overlap.")
+
+            size = st.st_size + sum(len(new) - (end - start) for start, end, new, _ in spans)
+            keep = size <= keep_text_bytes
+            kept = []
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as out, memoryview(mm) as view:
+                    pos = 0
+                    for start, end, new, _ in spans + [(st.st_size, st.st_size, b"", None)]:
+                        for piece in (view[pos:start], new):
+                            out.write(piece)
+                            if keep:
+                                kept.append(bytes(piece))
+                        pos = end
+                    out.flush()
+                    os.fsync(out.fileno())
+                os.chmod(temp_path, stat.S_IMODE(st.st_mode))
+                if hasattr(os, "chown"):
+                    try:
+                        os.chown(temp_path, st.st_uid, st.st_gid)
+                    except PermissionError:
+                        pass
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+        finally:
+            if st.st_size:
+                mm.close()
+
+    text = None
+    if keep:
+        try:
+            text = b"".join(kept).decode(encoding).replace("\r\n", "\n")
+        except UnicodeDecodeError:
+            pass
+    return PreparedEdit(path, temp_path, len(spans), size, text)
+
+
+def edit_file_atomic(path: str, edits: list, keep_text_bytes: int = 0) -> PreparedEdit:
+    """Apply edits to path in one pass and swap the result in atomically."""
+    prepared = prepare_edits(path, edits, keep_text_bytes)
+    try:
+        prepared.commit()
+    except BaseException:
+        prepared.discard()
+        raise
+    return prepared
+
+
+class EditTransaction:
+    """Edits to several files that are applied all together or not at all."""
+
+    def __init__(self, keep_text_bytes: int = 0):
+        self.keep_text_bytes = keep_text_bytes
+        self.edits = {}  # real path -> [(number, old_string, new_string)], in first-seen order
+        self.names = {}  # real path -> the path as first given
+        self.count = 0
+
+    def add(self, path: str, old_string: str, new_string: str):
+        self.count += 1
+        real = os.path.realpath(path)
+        self.names.setdefault(real, path)
+        self.edits.setdefault(real, []).append((self.count, old_string, new_string))
+
+    def apply(self) -> list:
+        """Check and apply every edit. Returns (path, PreparedEdit) per file.
+
+        Raises EditError, with no file changed, if any edit does not apply.
+        """
+        prepared = []
+        try:
+            for real, edits in self.edits.items():
+                name = self.names[real]
+                try:
+                    edit = prepare_edits(
+                        real,
+                        [(old, new) for _, old, new in edits],
+                        self.keep_text_bytes,
+                        numbers=[number for number, _, _ in edits],
+                    )
+                except OSError as e:
+                    raise EditError(f"{name}: {e.strerror or e}.") from e
+                except EditError as e:
+                    raise EditError(f"{name}: {e}") from e
+                prepared.append((name, edit))
+            self._commit(prepared)
+        finally:
+            for _, edit in prepared:
+                edit.discard()
+        return prepared
+
+    def _commit(self, prepared: list):
+        backups = []  # (path, backup path) of files already replaced
+        try:
+            for name, edit in prepared:
+                backup = edit.temp_path + ".orig"
+                os.link(edit.path, backup)  # keeps the old inode alive for a rollback
+                backups.append((edit.path, backup))
+                edit.commit()
+        except BaseException as e:
+            for path, backup in reversed(backups):
+                if os.path.samefile(backup, path):
+                    os.unlink(backup)  # this one was never replaced
+                else:
+                    os.replace(backup, path)
+            if isinstance(e, OSError):
+                raise EditError(f"could not replace {name}: {e.strerror or e}.") from e
+            raise
+        for _, backup in backups:
+            os.unlink(backup)
@@ -0,0 +1,201 @@
+"""
+Ranged reads for read_file.
+
+Reading part of a file never loads the rest: the file is memory-mapped and
+only the requested slice is decoded. Line ranges go through a LineIndex,
+which stores the newline count at every 64 KB checkpoint instead of every
+line start, so it stays small (about 1 KB per 8 MB of file) and finding a
+line only scans forward from the nearest checkpoint. Indexes are built the
+first time a file is read by line and cached until the file changes.
+
+Files too large to read whole get a head/tail summary with instructions for
+fetching the rest.
+"""
+
+import locale
+import mmap
+import os
+import threading
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+
+from read_cache import file_version
+
+CHECKPOINT_BYTES = 64 * 1024
+MAX_INDEXES = 32
+SUMMARY_HEAD_LINES = 100
+SUMMARY_TAIL_LINES = 50
+
+
+class LineIndex:
+    """Newline counts at fixed byte checkpoints of one file.
+
+    `lines_before[i]` is the number of newlines in the first
+    i * CHECKPOINT_BYTES bytes.
+    """
+
+    def __init__(self, mm, size: int):
+        self.size = size
+        self.lines_before = array("Q", [0])
+        count = 0
+        for start in range(0, size, CHECKPOINT_BYTES):
+            count += mm[start : start + CHECKPOINT_BYTES].count(b"\n")
+            self.lines_before.append(count)
+        self.newlines = count
+        # A last line without a trailing newline still counts
+        self.total_lines = count + (1 if size and mm[size - 1 : size] != b"\n" else 0)
+
+    def line_start(self, mm, line: int) -> int:
+        """Byte offset where 0-based `line` starts (the file size if past the end)."""
+        if line <= 0:
+            return 0
+        if line > self.newlines:
+            return self.size
+        i = bisect_left(self.lines_before, line) - 1  # last checkpoint before that newline
+        pos = i * CHECKPOINT_BYTES
+        for _ in range(line - self.lines_before[i]):
+            pos = mm.find(b"\n", pos) + 1
+        return pos
+
+
+_indexes = OrderedDict()  # abspath -> (version, LineIndex)
+_indexes_lock = threading.Lock()
+
+
+def line_index(path: str, mm, st) -> LineIndex:
+    """The cached LineIndex for path, rebuilt if the file has changed."""
+    path = os.path.abspath(path)
+    version = file_version(st)
+    with _indexes_lock:
+        entry = _indexes.get(path)
+        if entry is not None and entry[0] == version:
+            _indexes.move_to_end(path)
+            return entry[1]
+    index = LineIndex(mm, st.st_size)
+    with _indexes_lock:
+        _indexes[path] = (version, index)
+        while len(_indexes) > MAX_INDEXES:
+            _indexes.popitem(last=False)
+    return index
+
+
+def _decode(data: bytes) -> str:
+    text = data.decode(locale.getpreferredencoding(False), "replace")
+    if "\r" in text:
+        text = text.replace("\r\n", "\n")
+    return text
+
+
+def _clip_to_line(data: bytes) -> bytes:
+    """Drop a partial last line, unless that is the only line."""
+    end = data.rfind(b"\n")
+    return data[: end + 1] if end >= 0 else data
+
+
+class _Mapped:
+    """An open, memory-mapped file (or None for an empty one)."""
+
+    def __init__(self, path: str):
+        self.file = open(path, "rb")
+        self.st = os.fstat(self.file.fileno())
+        self.mm = None
+        if self.st.st_size:
+            self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if self.mm is not None:
+            self.mm.close()
+        self.file.close()
+
+
+def read_lines(path: str, offset: int = 1, limit: int = 2000, max_bytes: int = 256 * 1024) -> str:
+    """Lines offset .. offset+limit-1 (1-based), at most max_bytes of them."""
+    offset = max(offset, 1)
+    with _Mapped(path) as f:
+        if f.mm is None:
+            return "(empty file)"
+        index = line_index(path, f.mm, f.st)
+        if offset > index.total_lines:
+            return f"[{path} has {index.total_lines:,} lines; offset {offset:,} is past the end]"
+        start = index.line_start(f.mm, offset - 1)
+        end = index.line_start(f.mm, offset - 1 + limit)
+        data = f.mm[start : min(end, start + max_bytes)]
+        if start + len(data) < end and b"\n" in data:
+            data = _clip_to_line(data)
+        stop = start + len(data)
+        last = offset - 1 + data.count(b"\n") + (0 if data.endswith(b"\n") else 1)
+
+    if stop < end and not data.endswith(b"\n"):
+        footer = f"[line {last:,} is longer than {max_bytes:,} bytes; call read_file with byte_offset={stop} to read on]"
+    elif last < index.total_lines:
+        footer = f"[lines {offset:,}-{last:,} of {index.total_lines:,}; call read_file with offset={last + 1} to continue]"
+    else:
+        return _decode(data)
+    return _with_footer(_decode(data), footer)
+
+
+def read_bytes(path: str, byte_offset: int = 0, byte_limit: int = 256 * 1024) -> str:
+    """Bytes byte_offset .. byte_offset+byte_limit-1, decoded (partial characters replaced)."""
+    byte_offset = max(byte_offset, 0)
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if byte_offset >= size:
+            return f"[{path} is {size:,} bytes; byte_offset {byte_offset:,} is past the end]"
+        f.seek(byte_offset)
+        data = f.read(byte_limit)
+    end = byte_offset + len(data)
+    if end < size:
+        footer = f"[bytes {byte_offset:,}-{end:,} of {size:,}; call read_file with byte_offset={end} to continue]"
+        return _with_footer(_decode(data), footer)
+    return _decode(data)
+
+
+def _with_footer(text: str, footer: str) -> str:
+    return text + footer if text.endswith("\n") else f"{text}\n{footer}"
+
+
+def head_tail(path: str, max_bytes: int = 256 * 1024) -> str:
+    """First and last lines of a file that is too large to return whole."""
+    budget = max_bytes // 2
+    with _Mapped(path) as f:
+        size = f.st.st_size
+        size_mb = size / 1024 / 1024
+        index = line_index(path, f.mm, f.st)
+        head_end = index.line_start(f.mm, SUMMARY_HEAD_LINES)
+        head = f.mm[: min(head_end, budget)]
+        if not head.endswith(b"\n"):
+            if b"\n" not in head:
+                return (
+                    f"[{path} is {size_mb:.1f} MB and its first line is longer than {budget:,} bytes. "
+                    f"Showing the first {budget:,} bytes; call read_file with byte_offset/byte_limit to read more.]\n"
+                    + _decode(head)
+                )
+            head = _clip_to_line(head)
+        head_lines = head.count(b"\n")
+
+        # The tail: the last lines, within the budget, starting on a line boundary
+        tail_start = max(index.line_start(f.mm, index.total_lines - SUMMARY_TAIL_LINES), size - budget, len(head))
+        if tail_start > len(head) and f.mm[tail_start - 1 : tail_start] != b"\n":
+            newline = f.mm.find(b"\n", tail_start)
+            tail_start = newline + 1 if newline >= 0 else size
+        tail = f.mm[tail_start:]
+
+    if not tail:
+        shown = f"Showing lines 1-{head_lines:,}"
+    else:
+        tail_first = index.total_lines - tail.count(b"\n") + (1 if tail.endswith(b"\n") else 0)
+        shown = f"Showing lines 1-{head_lines:,} and {tail_first:,}-{index.total_lines:,}"
+    parts = [
+        f"[{path} is {size_mb:.1f} MB, {index.total_lines:,} lines: too large to read whole. {shown}. "
+        f"Call read_file with offset/limit (lines) or byte_offset/byte_limit to read other parts.]",
+        _decode(head).rstrip("\n"),
+    ]
+    if tail:
+        if tail_first > head_lines + 1:
+            parts.append(f"[... lines {head_lines + 1:,}-{tail_first - 1:,} not shown ...]")
+        parts.append(_decode(tail).rstrip("\n"))
+    return "\n".join(parts)
@@ -0,0 +1,275 @@
+"""
+Recursive, .gitignore-aware directory listings for list_files.
+
+Directories are read with os.scandir, whose entries already say whether
+they are directories, so a listing costs one syscall per directory instead
+of one stat per entry. The walk is breadth-first: when it stops at the
+entry limit, the model has still seen the top of the tree.
+
+FileTree keeps a snapshot of every directory it has read, keyed by the
+directory's mtime. Adding, removing or renaming an entry changes that
+mtime, so a repeated listing only re-stats the directories and re-reads
+the ones that changed. With a file watcher (workspace_watch.py), entries
+for the directories it covers are trusted without a stat, and the watcher
+calls `invalidate()` when they change.
+
+Ignore rules come from .gitignore files in the listed tree and its parents
+up to the repository root, and .git/info/exclude. The common gitignore
+syntax is supported: `*`, `?`, `**`, `[...]`, a leading `/` to anchor,
+a trailing `/` for directories only, and `!` to re-include.
+"""
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+
+# Never descended into, even without a .gitignore (search_files skips them too)
+SKIP_DIRS = {".git", "node_modules", "__pycache__", "venv"}
+MAX_CACHED_DIRS = 20_000
+# A directory changed within this long of being read may change again without
+# its mtime moving (coarse timestamps), so it is read again next time
+RACY_NS = 2_000_000_000
+
+
+def _translate(pattern: str) -> str:
+    """A gitignore glob as a regex body."""
+    out = []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+            continue
+        if pattern.startswith("/**", i) and i + 3 == len(pattern):
+            out.append("/.*")
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+            continue
+        if c == "*":
+            out.append("[^/]*")
+        elif c == "?":
+            out.append("[^/]")
+        elif c == "[":
+            end = pattern.find("]", i + 2)
+            if end < 0:
+                out.append(re.escape(c))
+            else:
+                body = pattern[i + 1 : end]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                out.append(f"[{body}]")
+                i = end
+        elif c == "\\" and i + 1 < len(pattern):
+            i += 1
+            out.append(re.escape(pattern[i]))
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return "".join(out)
+
+
+class IgnoreRules:
+    """The patterns of one ignore file, matched against paths relative to `base`."""
+
+    def __init__(self, base: str, lines):
+        self.base = base
+        self.rules = []  # (regex, negate, dir_only)
+        for line in lines:
+            line = line.rstrip("\n").rstrip()
+            if not line or line.startswith("#"):
+                continue
+            negate = line.startswith("!")
+            if negate:
+                line = line[1:]
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            if not line:
+                continue
+            anchored = "/" in line
+            body = _translate(line.lstrip("/"))
+            regex = re.compile(("^" if anchored else "^(?:.*/)?") + body + "$")
+            self.rules.append((regex, negate, dir_only))
+
+    def match(self, path: str, is_dir: bool):
+        """True (ignored), False (re-included) or None (no rule applies)."""
+        relative = os.path.relpath(path, self.base).replace(os.sep, "/")
+        result = None
+        for regex, negate, dir_only in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.match(relative):
+                result = not negate
+        return result
+
+
+def _git_root(path: str):
+    while True:
+        if os.path.exists(os.path.join(path, ".git")):
+            return path
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+
+
+class FileTree:
+    """Cached directory contents, refreshed by directory mtime."""
+
+    def __init__(self, max_dirs: int = MAX_CACHED_DIRS):
+        self.max_dirs = max_dirs
+        self._dirs = OrderedDict()  # realpath -> (mtime_ns, read_at_ns, [(name, is_dir, is_symlink)])
+        self._ignores = {}  # ignore file path -> (mtime_ns, IgnoreRules or None)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.trusted = None  # directory -> bool: a watcher will report its changes
+
+    def entries(self, path: str) -> list:
+        """Sorted (name, is_dir, is_symlink) entries of the directory at path."""
+        real = os.path.realpath(path)
+        if self.trusted is not None and self.trusted(real):
+            with self.lock:
+                cached = self._dirs.get(real)
+                if cached is not None:
+                    self._dirs.move_to_end(real)
+                    self.hits += 1
+                    return cached[2]
+        mtime = os.stat(real).st_mtime_ns
+        with self.lock:
+            cached = self._dirs.get(real)
+            if cached is not None and cached[0] == mtime and cached[1] - mtime > RACY_NS:
+                self._dirs.move_to_end(real)
+                self.hits += 1
+                return cached[2]
+            self.misses += 1
+        read_at = time.time_ns()
+        with os.scandir(real) as it:
+            listing = sorted((entry.name, entry.is_dir(), entry.is_symlink()) for entry in it)
+        with self.lock:
+            self._dirs[real] = (mtime, read_at, listing)
+            self._dirs.move_to_end(real)
+            while len(self._dirs) > self.max_dirs:
+                self._dirs.popitem(last=False)
+        return listing
+
+    def invalidate(self, path: str, tree: bool = False):
+        """Forget path and its parent directory (something in it changed).
+
+        With tree, also forget every directory under path.
+        """
+        real = os.path.realpath(path)
+        with self.lock:
+            self._dirs.pop(real, None)
+            self._dirs.pop(os.path.dirname(real), None)
+            self._ignores.pop(real, None)
+            if tree:
+                prefix = real.rstrip(os.sep) + os.sep
+                for stale in [d for d in self._dirs if d.startswith(prefix)]:
+                    del self._dirs[stale]
+                for stale in [f for f in self._ignores if f.startswith(prefix)]:
+                    del self._ignores[stale]
+
+    def clear(self):
+        with self.lock:
+            self._dirs.clear()
+            self._ignores.clear()
+
+    def _rules(self, ignore_file: str, base: str):
+        """The parsed rules of ignore_file, or None if it does not exist."""
+        try:
+            mtime = os.stat(ignore_file).st_mtime_ns
+        except OSError:
+            return None
+        with self.lock:
+            cached = self._ignores.get(ignore_file)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        try:
+            with open(ignore_file, errors="replace") as f:
+                rules = IgnoreRules(base, f)
+        except OSError:
+            rules = None
+        with self.lock:
+            self._ignores[ignore_file] = (mtime, rules)
+        return rules
+
+    def _inherited_rules(self, root: str) -> list:
+        """Ignore rules that apply to root from its parents, outermost first."""
+        git_root = _git_root(root)
+        if git_root is None:
+            return []
+        chain = []  # nearest parent first
+        directory = root
+        while directory != git_root:
+            directory = os.path.dirname(directory)
+            rules = self._rules(os.path.join(directory, ".gitignore"), directory)
+            if rules:
+                chain.append(rules)
+        exclude = self._rules(os.path.join(git_root, ".git", "info", "exclude"), git_root)
+        if exclude:
+            chain.append(exclude)
+        return chain[::-1]
+
+    def listing(self, path: str, depth: int = 1, max_entries: int = 1000, respect_ignore: bool = True) -> str:
+        """Entries under path down to depth levels, as "[DIR]  a/" / "[FILE] a/b" lines.
+
+        With depth 1 the names are bare, as the flat list_files has always shown them.
+        """
+        root = os.path.realpath(path)
+        inherited = self._inherited_rules(root) if respect_ignore else []
+        lines = []
+        queue = deque([(root, "", 1, inherited)])
+        unexpanded = 0
+        while queue:
+            directory, prefix, level, rules = queue.popleft()
+            if respect_ignore:
+                own = self._rules(os.path.join(directory, ".gitignore"), directory)
+                if own:
+                    rules = rules + [own]
+            try:
+                listing = self.entries(directory)
+            except OSError as e:
+                if directory == root:
+                    raise
+                lines.append(f"[DIR]  {prefix} (unreadable: {e.strerror})")
+                continue
+            for name, is_dir, is_symlink in listing:
+                full = os.path.join(directory, name)
+                if respect_ignore and (name == ".git" or self._ignored(rules, full, is_dir)):
+                    continue
+                if len(lines) >= max_entries:
+                    lines.append(f"[... stopped after {max_entries:,} entries; list a subdirectory, or use a smaller depth ...]")
+                    return "\n".join(lines)
+                if is_dir:
+                    lines.append(f"[DIR]  {prefix}{name}{'/' if depth > 1 else ''}")
+                    if name in SKIP_DIRS or is_symlink:
+                        continue
+                    if level < depth:
+                        queue.append((full, f"{prefix}{name}/", level + 1, rules))
+                    elif depth > 1:
+                        unexpanded += 1
+                else:
+                    lines.append(f"[FILE] {prefix}{name}")
+        if not lines:
+            return "(empty directory)"
+        if unexpanded:
+            noun = "directory" if unexpanded == 1 else "directories"
+            lines.append(f"[{unexpanded:,} {noun} at depth {depth} not expanded; list them to see inside]")
+        return "\n".join(lines)
+
+    def _ignored(self, rules: list, path: str, is_dir: bool) -> bool:
+        for ignore in reversed(rules):  # the nearest ignore file wins
+            result = ignore.match(path, is_dir)
+            if result is not None:
+                return result
+        return False
+
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
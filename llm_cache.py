@@ -0,0 +1,141 @@
+"""
+Record/replay cache for model calls.
+
+Re-running the same task sends the same requests. With LLM_CACHE=1 every
+reply is stored on disk under a hash of the request (model, system prompt,
+tools and messages) and re-used when the same request comes again, so a
+re-run is instant and free. LLM_CACHE=replay is strict: a request that is not
+in the cache raises CacheMiss instead of calling the model, which makes
+benchmark runs deterministic.
+
+Entries expire after a TTL, and the oldest are deleted once the store grows
+past its byte limit. Prompt-caching markers are ignored when hashing, so
+the same conversation hits with PROMPT_CACHE on or off.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+CACHE_DIR = os.getenv("LLM_CACHE_DIR", os.path.expanduser("~/.cache/agent-llm-cache"))
+FORMAT_VERSION = 1
+
+
+class CacheMiss(Exception):
+    """Strict replay mode got a request that was never recorded."""
+
+
+def plain(obj):
+    """JSON-ready form of a request or reply, including SDK objects.
+
+    Cached replies are stored in this form, so a history holding SDK
+    objects and one holding replayed dicts hash the same.
+    """
+    if hasattr(obj, "model_dump"):
+        obj = obj.model_dump(mode="json", exclude_none=True)
+    if isinstance(obj, dict):
+        return {key: plain(value) for key, value in obj.items() if key != "cache_control" and value is not None}
+    if isinstance(obj, (list, tuple)):
+        return [plain(value) for value in obj]
+    return obj
+
+
+def request_key(request: dict) -> str:
+    fields = {name: request.get(name) for name in ("model", "system", "tools", "messages")}
+    data = json.dumps(plain(fields), sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(f"{FORMAT_VERSION}:{data}".encode()).hexdigest()
+
+
+class ResponseCache:
+    """Replies on disk, one JSON file per request hash."""
+
+    def __init__(self, directory: str = CACHE_DIR, ttl: float = 7 * 24 * 3600, max_bytes: int = 256 * 1024 * 1024, strict: bool = False):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.strict = strict
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self._total_bytes = None  # measured on the first store
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + ".json")
+
+    def get(self, request: dict):
+        """The stored reply for request, or None (CacheMiss if strict)."""
+        key = request_key(request)
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            entry = None
+        if entry is not None and self.ttl and time.time() - entry["created"] > self.ttl:
+            self._remove(path)
+            entry = None
+        with self.lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if entry is None:
+            if self.strict:
+                raise CacheMiss(f"no recorded reply for request {key[:12]} in {self.directory}")
+            return None
+        return entry["reply"]
+
+    def put(self, request: dict, reply: dict):
+        if self.strict:
+            return  # replay never writes
+        key = request_key(request)
+        path = self._path(key)
+        data = json.dumps({"key": key, "created": time.time(), "model": request.get("model"), "reply": plain(reply)})
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        with self.lock:
+            if self._total_bytes is None:
+                self._total_bytes = sum(size for _, size, _ in self._entries())
+            else:
+                self._total_bytes += len(data)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        """(path, size, mtime) of every stored reply."""
+        if not os.path.isdir(self.directory):
+            return
+        for bucket in os.scandir(self.directory):
+            if not bucket.is_dir():
+                continue
+            for entry in os.scandir(bucket.path):
+                if entry.name.endswith(".json"):
+                    st = entry.stat()
+                    yield entry.path, st.st_size, st.st_mtime
+
+    def _evict(self):
+        """Delete expired replies, then the oldest, until under 90% of max_bytes."""
+        entries = sorted(self._entries(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        now = time.time()
+        for path, size, mtime in entries:
+            expired = self.ttl and now - mtime > self.ttl
+            if not expired and total <= self.max_bytes * 0.9:
+                break
+            self._remove(path)
+            total -= size
+        self._total_bytes = total
+
+    def _remove(self, path: str):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+    def summary(self) -> str:
+        return f"{self.hits} cached / {self.misses} live model calls"
@@ -0,0 +1,161 @@
+"""
+A local, scripted OpenAI-compatible chat completions server.
+
+Replays a fixed list of assistant replies, one per request, so the agent
+can be run end to end with no network and no API key. Supports both plain
+and streamed (`stream: true`) responses, reports `usage` with an estimated
+prompt token count, and records the wall time of every request.
+
+A reply is either {"text": "..."} or {"tool_calls": [[name, args], ...]}.
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from compaction import estimate_tokens
+
+
+class MockLLM:
+    """Scripted model plus the stats the benchmark reads back."""
+
+    def __init__(self, latency: float = 0.0, token_delay: float = 0.0):
+        self.latency = latency  # seconds before the first byte of each reply
+        self.token_delay = token_delay  # seconds between streamed chunks
+        self.replies = []
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.request_seconds = 0.0
+        self.call_counter = 0
+
+    def load(self, replies: list):
+        with self.lock:
+            self.replies = list(replies)
+
+    def next_reply(self) -> dict:
+        with self.lock:
+            if not self.replies:
+                return {"text": "(mock script exhausted)"}
+            return self.replies.pop(0)
+
+    def record(self, prompt_tokens: int, seconds: float):
+        with self.lock:
+            self.requests += 1
+            self.prompt_tokens += prompt_tokens
+            self.request_seconds += seconds
+
+    def tool_calls(self, reply: dict) -> list:
+        calls = []
+        with self.lock:
+            for name, args in reply.get("tool_calls", []):
+                self.call_counter += 1
+                calls.append(
+                    {
+                        "id": f"call_{self.call_counter}",
+                        "type": "function",
+                        "function": {"name": name, "arguments": json.dumps(args)},
+                    }
+                )
+        return calls
+
+
+def _chunk(delta: dict, finish_reason=None) -> bytes:
+    body = {
+        "id": "chatcmpl-mock",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": "mock",
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(body)}\n\n".encode()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    mock = None  # set by serve()
+
+    def log_message(self, format, *args):
+        pass
+
+    def handle(self):
+        try:
+            super().handle()
+        except ConnectionResetError:
+            pass  # the client dropped a keep-alive connection
+
+    def do_POST(self):
+        start = time.perf_counter()
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        prompt_tokens = estimate_tokens(request.get("messages", []))
+        reply = self.mock.next_reply()
+        calls = self.mock.tool_calls(reply)
+        text = reply.get("text")
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(text or "") // 4 + 1,
+            "total_tokens": prompt_tokens + len(text or "") // 4 + 1,
+        }
+        time.sleep(self.mock.latency)
+
+        if request.get("stream"):
+            self._stream(text, calls)
+        else:
+            message = {"role": "assistant", "content": text}
+            if calls:
+                message["tool_calls"] = calls
+            body = {
+                "id": "chatcmpl-mock",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": "mock",
+                "choices": [{"index": 0, "message": message, "finish_reason": "tool_calls" if calls else "stop"}],
+                "usage": usage,
+            }
+            data = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        self.mock.record(prompt_tokens, time.perf_counter() - start)
+
+    def _stream(self, text, calls):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def send(data: bytes):
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+            time.sleep(self.mock.token_delay)
+
+        send(_chunk({"role": "assistant", "content": ""}))
+        text = text or ""
+        for i in range(0, len(text), 16):
+            send(_chunk({"content": text[i : i + 16]}))
+        for index, call in enumerate(calls):
+            # Name first, then the arguments, as real providers split them
+            head = {"index": index, "id": call["id"], "type": "function",
+                    "function": {"name": call["function"]["name"], "arguments": ""}}
+            args = {"index": index, "function": {"arguments": call["function"]["arguments"]}}
+            send(_chunk({"tool_calls": [head]}))
+            send(_chunk({"tool_calls": [args]}))
+        send(_chunk({}, finish_reason="tool_calls" if calls else "stop"))
+        send(b"data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+def serve(mock: MockLLM, port: int = 0):
+    """Start the server on a background thread. Returns (server, base_url)."""
+    handler = type("Handler", (_Handler,), {"mock": mock})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
@@ -0,0 +1,157 @@
+"""
+Speculative prefetch into the read cache.
+
+After a search or a listing, and after reading a file, the model usually
+reads some of the files it was just shown. A Prefetcher guesses which, and
+reads them into the ReadCache on a background thread while the next model
+call is in flight, so that read_file is then served from memory:
+
+  search_files  the files with the most matches
+  list_files    well-known entry points (README, __init__.py, main.py, ...),
+                then the other files in the order listed
+  read_file     the local modules the file imports (Python, and relative
+                JS/TS imports)
+  user prompt   file paths named in it
+
+Only a few files are taken per hint, and prefetched entries that read_file
+has not asked for yet may take at most `max_bytes` of the cache, so
+speculation cannot push out what the model actually read. `hit_rate()` is
+the share of prefetched files that read_file then took from the cache.
+"""
+
+import os
+import re
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+MATCH_LINE = re.compile(r"^(.*?):\d+: ")  # search_files: "path:line: text"
+GROUP_LINE = re.compile(r"^(\S.*) \(\d+ matches\)$")  # the same, grouped by result_limits.py
+PROMPT_PATH = re.compile(r"(?<![\w/.-])((?:[\w.-]+/)*[\w-]+\.[A-Za-z0-9]{1,8})\b")
+PY_IMPORT = re.compile(r"^\s*(?:from\s+(\.*[\w.]*)\s+import\s+([\w, ]+)|import\s+([\w.]+))", re.MULTILINE)
+JS_IMPORT = re.compile(r"""(?:from\s+|require\(\s*|import\(\s*|^import\s+)['"](\.{1,2}/[^'"]+)['"]""", re.MULTILINE)
+JS_SUFFIXES = ("", ".ts", ".tsx", ".js", ".jsx", ".mjs", "/index.ts", "/index.js")
+ENTRY_POINTS = {
+    "README.md", "README.rst", "README", "__init__.py", "main.py", "app.py", "setup.py", "pyproject.toml",
+    "package.json", "index.js", "index.ts", "Cargo.toml", "go.mod", "Makefile",
+}
+
+
+# --- Candidates, most likely first ---
+
+
+def search_candidates(result: str, args: dict) -> list:
+    counts = Counter()
+    for line in result.split("\n"):
+        match = GROUP_LINE.match(line) or MATCH_LINE.match(line)
+        if match is not None:
+            counts[match.group(1)] += 1
+    return [path for path, _ in counts.most_common()]  # ties keep the order found
+
+
+def listing_candidates(result: str, args: dict) -> list:
+    base = args.get("path") or "."
+    files = [os.path.join(base, line[7:]) for line in result.split("\n") if line.startswith("[FILE] ")]
+    return sorted(files, key=lambda path: os.path.basename(path) not in ENTRY_POINTS)
+
+
+def import_candidates(path: str, text: str) -> list:
+    """Files in the workspace that the file at path imports."""
+    directory = os.path.dirname(os.path.abspath(path))
+    found = []
+    if path.endswith(".py"):
+        for source, names, module in PY_IMPORT.findall(text):
+            module = module or source
+            dots = len(module) - len(module.lstrip("."))
+            # Relative imports start from the file's package, absolute ones from the working directory
+            base = directory if dots else "."
+            for _ in range(max(dots - 1, 0)):
+                base = os.path.dirname(base)
+            stem = os.path.join(base, *module.lstrip(".").split(".")) if module.lstrip(".") else base
+            found += [stem + ".py", os.path.join(stem, "__init__.py")]
+            for name in names.replace(" ", "").split(",") if names else ():
+                found.append(os.path.join(stem, name + ".py"))  # "from pkg import module"
+    elif path.endswith((".js", ".jsx", ".ts", ".tsx", ".mjs")):
+        for relative in JS_IMPORT.findall(text):
+            stem = os.path.normpath(os.path.join(directory, relative))
+            found += [stem + suffix for suffix in JS_SUFFIXES]
+    return [candidate for candidate in found if os.path.isfile(candidate)]
+
+
+def prompt_candidates(text: str) -> list:
+    return [path for path in PROMPT_PATH.findall(text) if os.path.isfile(path)]
+
+
+class Prefetcher:
+    """Reads likely next files into a ReadCache on background threads."""
+
+    def __init__(
+        self,
+        cache,
+        max_bytes: int = 8 * 1024 * 1024,
+        max_files: int = 6,
+        max_file_bytes: int = 256 * 1024,
+        workers: int = 2,
+    ):
+        self.cache = cache
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.max_file_bytes = max_file_bytes  # larger files bypass the cache in read_file anyway
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+        self.lock = threading.Lock()  # one batch at a time, so the budget check holds
+        self.files = 0
+        self.bytes = 0
+        self.over_budget = 0
+
+    def after_tool(self, name: str, args: dict, result: str):
+        """Prefetch what a tool result suggests the model reads next. Returns at once."""
+        if not self.max_bytes or result.startswith("Error"):
+            return
+        if name == "search_files":
+            self.pool.submit(self._prefetch, search_candidates, result, args)
+        elif name == "list_files":
+            self.pool.submit(self._prefetch, listing_candidates, result, args)
+        elif name == "read_file" and all(value is None for key, value in args.items() if key != "path"):
+            self.pool.submit(self._prefetch, self._imports, args["path"])
+
+    def after_prompt(self, text: str):
+        if self.max_bytes:
+            self.pool.submit(self._prefetch, prompt_candidates, text)
+
+    def _imports(self, path: str) -> list:
+        text = self.cache.peek(path)
+        return import_candidates(path, text) if text is not None else []
+
+    def _prefetch(self, find, *args):
+        try:
+            paths = find(*args)
+        except Exception:
+            return  # a guess that failed costs nothing
+        with self.lock:
+            taken = 0
+            for path in dict.fromkeys(paths):
+                if taken >= self.max_files:
+                    break
+                try:
+                    size = os.path.getsize(path)
+                    if not os.path.isfile(path) or size > self.max_file_bytes:
+                        continue
+                    if self.cache.speculative_bytes + size > self.max_bytes:
+                        self.over_budget += 1
+                        continue
+                    if not self.cache.prefetch(path):
+                        continue  # already cached
+                except (OSError, UnicodeDecodeError):
+                    continue
+                taken += 1
+                self.files += 1
+                self.bytes += size
+
+    def hit_rate(self) -> float:
+        return self.cache.prefetch_hits / self.files if self.files else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"{self.files} files ({self.bytes / 1024:,.0f} KB) prefetched, "
+            f"{self.cache.prefetch_hits} then read (hit rate {100 * self.hit_rate():.0f}%)"
+        )
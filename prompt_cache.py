@@ -0,0 +1,76 @@
+"""
+Prompt-caching breakpoints for the Anthropic Messages API.
+
+Every request re-sends the system prompt, the tool definitions and the whole
+conversation. Marking the end of each with `cache_control` lets the API reuse
+the already-processed prefix, which is billed at a fraction of the input
+price and starts generating sooner.
+
+Breakpoints used (the API allows four):
+  - the last tool definition (covers all tools),
+  - the system prompt,
+  - the last message and the user message before it, so the conversation
+    prefix cached on the previous turn is still found on this one.
+
+The history itself is never modified; the markers go on shallow copies.
+"""
+
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
+def cached_system(system_prompt: str) -> list:
+    """The system prompt as a text block with a cache breakpoint."""
+    return [{"type": "text", "text": system_prompt, "cache_control": CACHE_CONTROL}]
+
+
+def cached_tools(tools: list) -> list:
+    """A copy of tools with a cache breakpoint on the last definition."""
+    if not tools:
+        return tools
+    return tools[:-1] + [{**tools[-1], "cache_control": CACHE_CONTROL}]
+
+
+def _with_breakpoint(message: dict):
+    """A copy of message with a cache breakpoint on its last content block."""
+    content = message["content"]
+    if isinstance(content, str):
+        if not content:
+            return None
+        blocks = [{"type": "text", "text": content}]
+    elif content:
+        blocks = list(content)
+    else:
+        return None
+
+    last = blocks[-1]
+    if not isinstance(last, dict):
+        if not hasattr(last, "model_dump"):
+            return None
+        last = last.model_dump(exclude_none=True)
+    blocks[-1] = {**last, "cache_control": CACHE_CONTROL}
+    return {**message, "content": blocks}
+
+
+def cached_messages(messages: list) -> list:
+    """A copy of messages with rolling breakpoints on the conversation tail."""
+    marked = list(messages)
+    targets = [len(marked) - 1] if marked else []
+    earlier_users = [i for i in range(len(marked) - 1) if marked[i]["role"] == "user"]
+    if earlier_users:
+        targets.append(earlier_users[-1])
+
+    for i in targets:
+        message = _with_breakpoint(marked[i])
+        if message is not None:
+            marked[i] = message
+    return marked
+
+
+def cache_summary(usage) -> str:
+    """Cache hit/miss token counts from a response's usage block."""
+    read = getattr(usage, "cache_read_input_tokens", 0) or 0
+    written = getattr(usage, "cache_creation_input_tokens", 0) or 0
+    uncached = getattr(usage, "input_tokens", 0) or 0
+    total = read + written + uncached
+    hit_rate = f"{100 * read / total:.0f}%" if total else "n/a"
+    return f"read {read:,} / wrote {written:,} / uncached {uncached:,} input tokens (hit {hit_rate})"
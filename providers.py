@@ -0,0 +1,240 @@
+"""
+Provider adapters.
+
+The conversation loop (agent_core.py) and the tools (agent_tools.py) are
+the same for every model. A Provider is the part that differs: how to build
+the SDK client, which session class speaks its message format, how its tool
+schemas look, how to estimate its tokens, and the optimizations only it
+offers:
+
+  openai     Any OpenAI-compatible endpoint (OpenAI, Gemini, vLLM, ...).
+             On api.openai.com it asks for parallel tool calls and for
+             token usage at the end of streamed replies.
+  anthropic  The native Anthropic SDK, with prompt-caching breakpoints.
+  ollama     A local Ollama server through its OpenAI-compatible API. The
+             model is loaded into memory in the background as soon as the
+             client is built, so the first turn does not wait for it, and
+             the context budget follows the server's context length.
+
+Every provider streams, records token usage on each model-call span and in
+`session.usage`, and shares the response cache and tracer below.
+
+The SDKs are imported, and their clients built, only when the first model
+call needs one (see LazyClient): importing openai or anthropic pulls in
+httpx and pydantic and takes hundreds of milliseconds, which a short-lived
+run should not pay before the user has typed anything, or at all when every
+reply comes from the response cache. The REPL calls `warm_up()` to import
+the SDK on a background thread while the user types the first prompt.
+"""
+
+import importlib
+import json
+import os
+import threading
+
+from agent_core import AnthropicSession, OpenAISession
+from agent_tools import SYSTEM_PROMPT, execute_tool_async, forget_dropped_read, prefetcher, tools
+from llm_cache import ResponseCache
+from result_limits import ResultLimiter, make_tokenizer
+from tracing import tracer_from_env
+
+# --- Configuration shared by every provider ---
+MAX_TOKENS = 4096
+STREAM = os.getenv("STREAM", "0") == "1"
+CONTEXT_BUDGET = int(os.getenv("CONTEXT_BUDGET", "100000"))
+TOOL_RESULT_TOKENS = int(os.getenv("TOOL_RESULT_TOKENS", "10000"))
+LLM_CACHE = os.getenv("LLM_CACHE", "0")  # "1" record and re-use replies, "replay" replay only
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+LLM_CACHE_BYTES = int(os.getenv("LLM_CACHE_BYTES", str(256 * 1024 * 1024)))
+
+# Recorded model replies for LLM_CACHE=1 / replay, shared by every session
+response_cache = None
+if LLM_CACHE != "0":
+    response_cache = ResponseCache(ttl=LLM_CACHE_TTL, max_bytes=LLM_CACHE_BYTES, strict=LLM_CACHE == "replay")
+
+# Spans for TRACE=1 / TRACE_FILE / TRACE_OTLP (a no-op tracer otherwise)
+tracer = tracer_from_env()
+
+
+class LazyClient:
+    """Stands in for an SDK client and builds it on first use."""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._client = None
+
+    def __getattr__(self, name):
+        if self._client is None:
+            self._client = self._factory()
+        return getattr(self._client, name)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.close()
+
+
+class Provider:
+    """What one model provider needs beyond the shared loop and tools."""
+
+    name = None
+    default_model = None
+    session_class = None
+    sdk = None  # the module make_client imports
+
+    def __init__(self, model: str = None):
+        self.model = model or os.getenv("MODEL") or self.default_model
+        self.context_budget = CONTEXT_BUDGET
+        # Shrinks tool results past TOOL_RESULT_TOKENS, counted with this provider's tokenizer
+        self.result_limiter = ResultLimiter(TOOL_RESULT_TOKENS, make_tokenizer(self.name, self.model))
+
+    def make_client(self, http2: bool = False):
+        """The async SDK client. It owns a keep-alive connection pool, so
+        sessions that share one client reuse connections to the provider."""
+        raise NotImplementedError
+
+    def warm_up(self):
+        """Import the SDK in the background, so the first model call need not wait for it."""
+        threading.Thread(target=importlib.import_module, args=(self.sdk,), name="sdk-import", daemon=True).start()
+
+    def tool_schemas(self) -> list:
+        return tools.openai_schemas()
+
+    def session_options(self) -> dict:
+        """Keyword arguments only this provider's session class takes."""
+        return {}
+
+    def make_session(self, session_id: str = "default", output=None, client=None, on_span=None):
+        """Start a conversation with this provider's model and the shared tools.
+
+        Without a client the session gets its own, built on its first model
+        call; the server passes a shared one. `on_span` is told about each
+        model and tool call as it ends (see AgentSession).
+        """
+        return self.session_class(
+            client or LazyClient(self.make_client),
+            model=self.model,
+            tools=self.tool_schemas(),
+            execute_tool=execute_tool_async,
+            system_prompt=SYSTEM_PROMPT,
+            max_tokens=MAX_TOKENS,
+            stream=STREAM,
+            context_budget=self.context_budget,
+            session_id=session_id,
+            output=output,
+            on_drop=forget_dropped_read,
+            response_cache=response_cache,
+            tracer=tracer,
+            result_limiter=self.result_limiter,
+            tool_registry=tools,
+            on_prompt=prefetcher.after_prompt,
+            on_result=prefetcher.after_tool,
+            on_span=on_span,
+            **self.session_options(),
+        )
+
+
+class OpenAIProvider(Provider):
+    """Chat completions on OpenAI or any OpenAI-compatible endpoint."""
+
+    name = "openai"
+    default_model = "gpt-4o"
+    session_class = OpenAISession
+    sdk = "openai"
+
+    def __init__(self, model: str = None, api_key: str = None, base_url: str = None):
+        super().__init__(model)
+        self.api_key = api_key or os.getenv("OPENAI_API_KEY")
+        self.base_url = base_url or os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+
+    def make_client(self, http2: bool = False):
+        from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+        return AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, http_client=DefaultAsyncHttpxClient(http2=http2))
+
+    def session_options(self) -> dict:
+        # Other OpenAI-compatible servers may reject fields they don't know
+        if "api.openai.com" not in self.base_url:
+            return {}
+        return {"request_options": {"parallel_tool_calls": True}, "stream_usage": True}
+
+
+class AnthropicProvider(Provider):
+    """The native Anthropic Messages API."""
+
+    name = "anthropic"
+    default_model = "claude-sonnet-4-20250514"
+    session_class = AnthropicSession
+    sdk = "anthropic"
+
+    def __init__(self, model: str = None, prompt_cache: bool = None):
+        super().__init__(model)
+        self.prompt_cache = os.getenv("PROMPT_CACHE", "1") == "1" if prompt_cache is None else prompt_cache
+
+    def make_client(self, http2: bool = False):
+        import anthropic
+
+        return anthropic.AsyncAnthropic(http_client=anthropic.DefaultAsyncHttpxClient(http2=http2))
+
+    def tool_schemas(self) -> list:
+        return tools.anthropic_schemas()
+
+    def session_options(self) -> dict:
+        return {"prompt_cache": self.prompt_cache}
+
+
+class OllamaProvider(OpenAIProvider):
+    """A local Ollama server, through its OpenAI-compatible endpoint."""
+
+    name = "ollama"
+    default_model = "qwen2.5"
+
+    def __init__(self, model: str = None, host: str = None):
+        self.host = (host or os.getenv("OLLAMA_HOST", "http://localhost:11434")).rstrip("/")
+        if "://" not in self.host:
+            self.host = "http://" + self.host
+        super().__init__(model, api_key="ollama", base_url=self.host + "/v1")
+        self.keep_alive = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+        # Ollama silently drops the start of a prompt longer than its context, so
+        # compact well before that
+        context = int(os.getenv("OLLAMA_CONTEXT", "8192"))
+        if "CONTEXT_BUDGET" not in os.environ:
+            self.context_budget = context * 3 // 4
+        self._preloaded = False
+
+    def make_client(self, http2: bool = False):
+        self.preload()
+        return super().make_client(http2=False)  # Ollama speaks HTTP/1.1 only
+
+    def make_session(self, session_id: str = "default", output=None, client=None, on_span=None):
+        self.preload()  # the client itself is only built on the first model call
+        return super().make_session(session_id, output=output, client=client, on_span=on_span)
+
+    def preload(self):
+        """Load the model in the background, so the first turn does not wait for it."""
+        if self._preloaded:
+            return
+        self._preloaded = True
+        threading.Thread(target=self._load_model, name="ollama-preload", daemon=True).start()
+
+    def _load_model(self):
+        import urllib.request
+
+        # An empty generate request loads the model and sets how long it stays loaded
+        body = json.dumps({"model": self.model, "keep_alive": self.keep_alive}).encode()
+        request = urllib.request.Request(self.host + "/api/generate", data=body, headers={"Content-Type": "application/json"})
+        try:
+            urllib.request.urlopen(request, timeout=300).close()
+        except OSError:
+            pass  # the first real request reports any problem
+
+
+PROVIDERS = {"openai": OpenAIProvider, "anthropic": AnthropicProvider, "ollama": OllamaProvider}
+
+
+def get_provider(name: str = None) -> Provider:
+    """The provider called name, or the one PROVIDER names (default openai)."""
+    name = name or os.getenv("PROVIDER", "openai")
+    try:
+        return PROVIDERS[name]()
+    except KeyError:
+        raise ValueError(f"unknown provider {name!r}; choose one of {', '.join(PROVIDERS)}") from None
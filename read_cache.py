@@ -0,0 +1,157 @@
+"""
+Read-through cache for read_file.
+
+The model re-reads the same files many times in a session. ReadCache keeps
+decoded file contents keyed by absolute path and checks each hit against the
+file's current (mtime, size, inode), so a changed or replaced file is always
+read fresh. Entries are evicted least recently used once their total size
+passes a byte budget.
+
+It also remembers which version of each file every conversation was last
+given, so read_file can answer "unchanged since your last read" instead of
+sending identical content again.
+
+Entries added by `prefetch()` (see prefetch.py) are speculative until
+read_file asks for them; `speculative_bytes` is how much of the cache they
+take, and `prefetch_hits` counts those read_file then served.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+UNCHANGED_PREFIX = "[unchanged since your last read"
+
+
+def file_version(st) -> tuple:
+    """What has to match for a cached copy to still be valid."""
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+class ReadCache:
+    """LRU map of path -> (version, text), bounded by total file bytes."""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # abspath -> (version, text)
+        self.total_bytes = 0
+        self.seen = {}  # session id -> {abspath: version last sent to the model}
+        self.hits = 0
+        self.misses = 0
+        self.speculative = {}  # abspath -> size of prefetched entries not read yet
+        self.prefetch_hits = 0
+        self.lock = threading.Lock()
+
+    def read(self, path: str) -> tuple:
+        """Return (text, version) for path, from the cache when it is current."""
+        path = os.path.abspath(path)
+        # Always one stat: a watcher hears of an outside write only some time after it
+        version = file_version(os.stat(path))
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is not None and entry[0] == version:
+                self._hit(path)
+                return entry[1], version
+            self.misses += 1
+        return self._load(path, version)
+
+    def prefetch(self, path: str) -> bool:
+        """Read path into the cache ahead of read_file. False if it was already there."""
+        path = os.path.abspath(path)
+        version = file_version(os.stat(path))
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is not None and entry[0] == version:
+                return False
+        self._load(path, version, speculative=True)
+        return True
+
+    def peek(self, path: str):
+        """The cached text for path, or None; not checked against the disk or counted."""
+        with self.lock:
+            entry = self.entries.get(os.path.abspath(path))
+        return entry[1] if entry is not None else None
+
+    def _hit(self, path: str):
+        # Called with the lock held
+        self.entries.move_to_end(path)
+        self.hits += 1
+        if self.speculative.pop(path, None) is not None:
+            self.prefetch_hits += 1
+
+    def _load(self, path: str, version: tuple, speculative: bool = False) -> tuple:
+        with open(path, "r") as f:
+            text = f.read()
+            current = file_version(os.fstat(f.fileno()))
+        # If the file changed while it was read, return it but don't cache it
+        if current == version:
+            self._put(path, version, text, speculative)
+        return text, current
+
+    def store(self, path: str, text: str):
+        """Record content just written to path (by edit_file)."""
+        path = os.path.abspath(path)
+        self._put(path, file_version(os.stat(path)), text)
+
+    def invalidate(self, path: str, tree: bool = False):
+        """Forget path; with tree, also every file under it."""
+        path = os.path.abspath(path)
+        with self.lock:
+            paths = [path]
+            if tree:
+                prefix = path.rstrip(os.sep) + os.sep
+                paths += [cached for cached in self.entries if cached.startswith(prefix)]
+            for path in paths:
+                entry = self.entries.pop(path, None)
+                if entry is not None:
+                    self.total_bytes -= entry[0][1]
+                self.speculative.pop(path, None)
+
+    def _put(self, path: str, version: tuple, text: str, speculative: bool = False):
+        size = version[1]
+        with self.lock:
+            old = self.entries.pop(path, None)
+            if old is not None:
+                self.total_bytes -= old[0][1]
+            self.speculative.pop(path, None)
+            if size > self.max_bytes:
+                return
+            self.entries[path] = (version, text)
+            self.total_bytes += size
+            if speculative:
+                self.speculative[path] = size
+            while self.total_bytes > self.max_bytes:
+                evicted, (evicted_version, _) = self.entries.popitem(last=False)
+                self.total_bytes -= evicted_version[1]
+                self.speculative.pop(evicted, None)
+
+    @property
+    def speculative_bytes(self) -> int:
+        with self.lock:
+            return sum(self.speculative.values())
+
+    # --- What each conversation has already seen ---
+
+    def already_seen(self, session_id: str, path: str, version: tuple) -> bool:
+        """True if this session was last given exactly this version of path.
+
+        Either way, records version as the one the session now has.
+        """
+        path = os.path.abspath(path)
+        with self.lock:
+            versions = self.seen.setdefault(session_id, {})
+            unchanged = versions.get(path) == version
+            versions[path] = version
+            return unchanged
+
+    def forget(self, session_id: str, path: str = None):
+        """The session no longer has path (or any file) in its context."""
+        with self.lock:
+            if path is None:
+                self.seen.pop(session_id, None)
+            else:
+                self.seen.get(session_id, {}).pop(os.path.abspath(path), None)
+
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
@@ -0,0 +1,181 @@
+"""
+Token-aware limits for tool results.
+
+A tool can return any amount of text, and all of it goes into `messages`
+and is re-sent on every later request. ResultLimiter counts a result's
+tokens with the provider's tokenizer and, past the budget, shrinks it in a
+way that keeps its shape and says how to get the rest:
+
+  run_bash      first and last lines (the end of a log is usually what matters)
+  search_files  matches grouped by file, as many files as fit
+  list_files    every directory, then files collapsed into counts by extension
+  read_file     the first lines, with the offset to continue from
+  anything else first and last lines
+
+Token counts use tiktoken for OpenAI models when it is installed. Other
+providers, and OpenAI without tiktoken, use a characters-per-token estimate.
+"""
+
+import os
+import re
+from collections import Counter
+
+MATCH_LINE = re.compile(r"^(.*?):(\d+): ")
+MAX_MATCH_CHARS = 300
+
+
+class CharTokenizer:
+    """Estimates tokens from the character count."""
+
+    def __init__(self, chars_per_token: float = 4.0):
+        self.chars_per_token = chars_per_token
+
+    def count(self, text: str) -> int:
+        return int(len(text) / self.chars_per_token) + 1
+
+
+class TiktokenTokenizer:
+    def __init__(self, encoding):
+        self.encoding = encoding
+
+    def count(self, text: str) -> int:
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+
+def make_tokenizer(provider: str, model: str = ""):
+    """The closest local tokenizer for provider ("openai", "anthropic" or "ollama")."""
+    if provider == "openai":
+        try:
+            import tiktoken
+        except ImportError:
+            return CharTokenizer(4.0)
+        try:
+            return TiktokenTokenizer(tiktoken.encoding_for_model(model))
+        except KeyError:  # a non-OpenAI model behind an OpenAI-compatible endpoint
+            return TiktokenTokenizer(tiktoken.get_encoding("o200k_base"))
+    if provider == "anthropic":
+        # Anthropic has no local tokenizer; Claude averages a little under 4 chars per token
+        return CharTokenizer(3.5)
+    return CharTokenizer(4.0)
+
+
+class ResultLimiter:
+    """Caps each tool result at `budget` tokens."""
+
+    def __init__(self, budget: int, tokenizer=None):
+        self.budget = budget
+        self.tokenizer = tokenizer or CharTokenizer()
+
+    def limit(self, name: str, args: dict, result: str) -> str:
+        if not self.budget:
+            return result
+        # Cheap test first: a token is at least one character
+        if len(result) <= self.budget or self.tokenizer.count(result) <= self.budget:
+            return result
+        shrink = {
+            "run_bash": self._head_tail,
+            "search_files": self._search,
+            "list_files": self._listing,
+            "read_file": self._file,
+        }.get(name, self._head_tail)
+        return shrink(args, result)
+
+    # --- Fitting lines into a budget ---
+
+    def _take(self, lines, budget: int) -> int:
+        """How many of lines fit in budget tokens."""
+        used = 0
+        for count, line in enumerate(lines):
+            used += self.tokenizer.count(line) + 1
+            if used > budget:
+                return count
+        return len(lines)
+
+    def _head_tail(self, args: dict, result: str) -> str:
+        lines = result.split("\n")
+        budget = self.budget - 60  # room for the note
+        head = self._take(lines, budget * 2 // 5)
+        tail = self._take(lines[head:][::-1], budget - budget * 2 // 5)
+        if head == 0 and tail == 0:
+            return self._chars(result)
+        omitted = lines[head : len(lines) - tail]
+        hint = "re-run with the output redirected to a file, then page through it with read_file offset/limit"
+        note = f"[... {len(omitted):,} lines (~{self.tokenizer.count(chr(10).join(omitted)):,} tokens) omitted; {hint} ...]"
+        return "\n".join(lines[:head] + [note] + lines[len(lines) - tail :])
+
+    def _chars(self, result: str) -> str:
+        """A result that is one huge line: keep its start and end."""
+        keep = int(self.budget * 3)  # about 3 characters per token is safe for every tokenizer here
+        omitted = len(result) - keep
+        return f"{result[: keep // 2]}\n[... {omitted:,} characters omitted ...]\n{result[-keep // 2 :]}"
+
+    def _search(self, args: dict, result: str) -> str:
+        groups = {}
+        other = []
+        for line in result.split("\n"):
+            match = MATCH_LINE.match(line)
+            if match is None:
+                other.append(line)
+                continue
+            text = line[match.end() :]
+            if len(text) > MAX_MATCH_CHARS:
+                text = text[:MAX_MATCH_CHARS] + " [...]"
+            groups.setdefault(match.group(1), []).append(f"  {match.group(2)}: {text}")
+
+        out = []
+        budget = self.budget - 80
+        shown_files = shown_matches = 0
+        partial = False
+        for path, matches in groups.items():
+            block = [f"{path} ({len(matches)} matches)"] + matches
+            fit = self._take(block, budget)
+            if fit < 2:
+                break
+            out += block[:fit]
+            budget -= sum(self.tokenizer.count(line) + 1 for line in block[:fit])
+            shown_files += 1
+            shown_matches += fit - 1
+            if fit < len(block):
+                partial = True
+                break
+        total = sum(len(matches) for matches in groups.values())
+        if shown_matches < total:
+            files_left = len(groups) - shown_files + (1 if partial else 0)
+            out.append(
+                f"[... {total - shown_matches} more matches in {files_left} files; "
+                "search a narrower path or a more specific pattern to see them ...]"
+            )
+        return "\n".join(out + [line for line in other if line])
+
+    def _listing(self, args: dict, result: str) -> str:
+        lines = result.split("\n")
+        dirs = [line for line in lines if line.startswith("[DIR]")]
+        files = [line for line in lines if not line.startswith("[DIR]")]
+        extensions = Counter(os.path.splitext(line.split("] ", 1)[-1].strip())[1] or "(none)" for line in files)
+        summary = ", ".join(f"{count:,} {ext}" for ext, count in extensions.most_common(10))
+        note = f"[FILE] {len(files):,} files: {summary}"
+
+        budget = self.budget - self.tokenizer.count(note) - 60
+        shown_dirs = self._take(dirs, budget)
+        out = dirs[:shown_dirs]
+        if shown_dirs < len(dirs):
+            out.append(f"[... {len(dirs) - shown_dirs:,} more directories ...]")
+        budget -= sum(self.tokenizer.count(line) + 1 for line in out)
+        shown_files = self._take(files, max(budget, 0))
+        out += files[:shown_files]
+        if shown_files < len(files):
+            out.append(f"{note}; {len(files) - shown_files:,} not listed. List a subdirectory, or use run_bash with find/ls and a filter.")
+        return "\n".join(out)
+
+    def _file(self, args: dict, result: str) -> str:
+        lines = result.split("\n")
+        keep = self._take(lines, self.budget - 60)
+        if keep == 0:
+            return self._chars(result)
+        first = args.get("offset") or 1
+        end = first + keep - 1
+        if args.get("byte_offset") is not None or args.get("byte_limit") is not None:
+            hint = "call read_file with a smaller byte_limit"
+        else:
+            hint = f"call read_file with offset={end + 1} and a limit to read on"
+        return "\n".join(lines[:keep] + [f"[... showing lines {first:,}-{end:,} of this result to fit the context; {hint} ...]"])
@@ -0,0 +1,191 @@
+"""
+Persistent shell sessions for run_bash.
+
+Starting a fresh `/bin/sh` for every command loses the working directory,
+environment variables and virtualenv activation, and pays process start-up
+each time. A ShellSession keeps one long-lived shell per conversation and
+runs each command through it, marking the end of the command's output with
+a random sentinel line that also carries the exit status.
+
+Output goes through the same head/tail byte budget as one-off commands. A
+command that times out or floods its output kills the session, which is
+restarted automatically on the next command.
+"""
+
+import os
+import selectors
+import shlex
+import signal
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+from bash_capture import KILL_AFTER_BYTES, OUTPUT_BUDGET, BoundedResult, HeadTailBuffer
+
+SHELL = "/bin/bash" if os.path.exists("/bin/bash") else "/bin/sh"
+READ_SIZE = 64 * 1024
+
+
+class _Stream:
+    """Collects one pipe's output up to the sentinel, within a byte budget."""
+
+    def __init__(self, marker: bytes, budget: int, echo_to):
+        self.marker = marker
+        self.buffer = HeadTailBuffer(budget)
+        self.pending = bytearray()
+        self.echo_to = echo_to
+        self.status = None
+        self.done = False
+
+    def feed(self, data: bytes):
+        self.pending += data
+        index = self.pending.find(self.marker)
+        if index >= 0:
+            # The sentinel line is complete once its trailing newline arrives
+            end = self.pending.find(b"\n", index + len(self.marker))
+            if end < 0:
+                return
+            self._emit(self.pending[:index])
+            self.status = self.pending[index + len(self.marker) : end].strip()
+            self.done = True
+            return
+        # Hold back anything that could be the start of a split marker
+        keep = len(self.marker) - 1
+        if len(self.pending) > keep:
+            self._emit(self.pending[:-keep])
+            del self.pending[:-keep]
+
+    def flush(self):
+        """Keep whatever arrived before the shell went away."""
+        if not self.done:
+            self._emit(self.pending)
+            self.pending.clear()
+
+    def _emit(self, data):
+        if not data:
+            return
+        self.buffer.write(bytes(data))
+        if self.echo_to is not None:
+            self.echo_to.buffer.write(data)
+            self.echo_to.flush()
+
+
+class ShellSession:
+    """One long-lived shell that keeps cwd and environment between commands."""
+
+    def __init__(self, cwd=None):
+        self.cwd = cwd
+        self.proc = None
+        self.lock = threading.Lock()
+        self.sentinel = f"__agent_done_{uuid.uuid4().hex}__"
+
+    @property
+    def alive(self) -> bool:
+        return self.proc is not None and self.proc.poll() is None
+
+    def start(self):
+        self.proc = subprocess.Popen(
+            [SHELL],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            cwd=self.cwd,
+            start_new_session=True,  # so the whole process group can be killed
+            bufsize=0,
+        )
+
+    def close(self):
+        if self.proc is None:
+            return
+        try:
+            os.killpg(self.proc.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+        self.proc.wait()
+        for pipe in (self.proc.stdin, self.proc.stdout, self.proc.stderr):
+            pipe.close()
+        self.proc = None
+
+    def run(self, command: str, timeout: float = 30, budget: int = OUTPUT_BUDGET, echo: bool = False) -> BoundedResult:
+        """Run command in the session and wait for its sentinel."""
+        with self.lock:
+            if not self.alive:
+                self.close()
+                self.start()
+
+            marker = f"\n{self.sentinel}".encode()
+            script = (
+                f"eval {shlex.quote(command)} < /dev/null\n"
+                f"printf '\\n{self.sentinel} %d\\n' \"$?\"\n"
+                f"printf '\\n{self.sentinel}\\n' >&2\n"
+            )
+            streams = {
+                self.proc.stdout.fileno(): _Stream(marker, budget, sys.stdout if echo else None),
+                self.proc.stderr.fileno(): _Stream(marker, budget, sys.stderr if echo else None),
+            }
+            stdout, stderr = streams.values()
+
+            timed_out = killed = exited = False
+            try:
+                self.proc.stdin.write(script.encode())
+            except BrokenPipeError:
+                exited = True
+
+            deadline = time.monotonic() + timeout
+            with selectors.DefaultSelector() as selector:
+                for fd in streams:
+                    selector.register(fd, selectors.EVENT_READ)
+                while not exited and not (stdout.done and stderr.done):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        timed_out = True
+                        break
+                    for key, _ in selector.select(remaining):
+                        data = os.read(key.fd, READ_SIZE)
+                        if not data:
+                            exited = True  # the command ran `exit` or killed the shell
+                            break
+                        streams[key.fd].feed(data)
+                    if stdout.buffer.total + stderr.buffer.total > KILL_AFTER_BYTES:
+                        killed = True
+                        break
+
+            if timed_out or killed or exited:
+                stdout.flush()
+                stderr.flush()
+                self.close()
+
+            returncode = None
+            if stdout.status:
+                returncode = int(stdout.status)
+            return BoundedResult(stdout.buffer.text(), stderr.buffer.text(), returncode, timed_out, killed)
+
+
+class SessionPool:
+    """One ShellSession per conversation, created on first use."""
+
+    def __init__(self, cwd=None):
+        self.cwd = cwd
+        self.sessions = {}
+        self.lock = threading.Lock()
+
+    def get(self, session_id: str) -> ShellSession:
+        with self.lock:
+            if session_id not in self.sessions:
+                self.sessions[session_id] = ShellSession(self.cwd)
+            return self.sessions[session_id]
+
+    def run(self, session_id: str, command: str, timeout: float = 30, echo: bool = False) -> BoundedResult:
+        return self.get(session_id).run(command, timeout=timeout, echo=echo)
+
+    def close(self, session_id: str):
+        with self.lock:
+            session = self.sessions.pop(session_id, None)
+        if session is not None:
+            session.close()
+
+    def close_all(self):
+        for session_id in list(self.sessions):
+            self.close(session_id)
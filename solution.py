@@ -1,323 +1,55 @@
 """
 AI Coding Agent — Complete Solution
 
-A working coding agent in ~300 lines of Python.
-This is the facilitator reference / complete solution.
+The facilitator reference: the complete agent the workshop builds towards.
+The conversation loop lives in agent_core.py, the tools in agent_tools.py
+and what differs between model providers in providers.py; this file picks
+a provider and runs the terminal front end (agent_repl.py) on it.
 
 Provider compatibility (set env vars before running):
   OpenAI (default):  OPENAI_API_KEY=sk-...
   Gemini:            OPENAI_API_KEY=... OPENAI_BASE_URL=https://generativelanguage.googleapis.com/v1beta/openai/ MODEL=gemini-2.0-flash
-  Ollama:            OPENAI_BASE_URL=http://localhost:11434/v1 OPENAI_API_KEY=unused MODEL=qwen2.5
-  Anthropic:         OPENAI_API_KEY=sk-ant-... OPENAI_BASE_URL=https://api.anthropic.com/v1/ MODEL=claude-sonnet-4-20250514
+  Ollama:            PROVIDER=ollama MODEL=qwen2.5 (OLLAMA_HOST, OLLAMA_CONTEXT and OLLAMA_KEEP_ALIVE tune it)
+  Anthropic:         PROVIDER=anthropic ANTHROPIC_API_KEY=sk-ant-... (or run solution_anthropic.py)
+
+Options:
+  STREAM=1           Stream replies token by token and start tools as soon as their arguments arrive
+  TOOL_WORKERS=8     Threads for running independent tool calls in parallel
+  SEARCH_PROCESSES=N Processes for scanning large trees in search_files (defaults to CPU count)
+  SEARCH_INDEX=1     Narrow search_files with a persistent trigram index (SEARCH_INDEX_DIR sets where)
+  CONTEXT_BUDGET=N   Compact old tool results once the history passes N tokens (0 disables)
+  BASH_ECHO=1        Echo run_bash output to the terminal as it is produced
+  BASH_SESSION=1     Run commands in one persistent shell, keeping cwd and environment between calls
+  BASH_OUTPUT_BYTES  Bytes of each run_bash stream kept for the model (head + tail, default 32768)
+  READ_CACHE_BYTES   Bytes of file contents kept in the read_file cache (default 64 MB)
+  READ_UNCHANGED=0   Always resend a file's content, even if the model already has that version
+  READ_MAX_BYTES     Largest file or range read_file returns; bigger files get a head/tail summary (default 256 KB)
+  LIST_DEPTH=3       Default depth of a recursive list_files (LIST_MAX_ENTRIES caps its entries, default 1000)
+  WATCH=0            Don't watch the workspace for outside changes (WATCH=poll polls mtimes instead of using inotify)
+  TOOL_RESULT_TOKENS Tokens a tool result may use before it is shrunk, keeping its structure (default 10000, 0 disables)
+  LLM_CACHE=1        Record model replies on disk and re-use them for identical requests (LLM_CACHE_DIR sets where)
+  LLM_CACHE=replay   Only replay recorded replies; a request that was never recorded is an error
+  TRACE=1            Time every model and tool call and print a summary table on exit
+  TRACE_FILE=path    Also append each span to a JSONL file as it finishes
+  TRACE_OTLP=path    Also write the spans as OpenTelemetry OTLP/JSON on exit
+  PROMPT_CACHE=0     Anthropic only: turn off prompt-caching breakpoints (on by default)
 """
 
 import os
-import re
-import subprocess
-from openai import OpenAI
 
-# --- Configuration ---
-API_KEY = os.getenv("OPENAI_API_KEY")
-BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
-MODEL = os.getenv("MODEL", "gpt-4o")
-MAX_TOKENS = 4096
+import agent_repl
+from providers import get_provider
 
-client = OpenAI(api_key=API_KEY, base_url=BASE_URL)
+PROVIDER = os.getenv("PROVIDER", "openai")
 
-SYSTEM_PROMPT = """You are a helpful coding assistant. You have access to tools that let you
-read, list, edit, and search files, and run bash commands. Use these tools to help the user
-with their coding tasks.
+# The model provider: its client, session class and tool-schema format
+provider = get_provider(PROVIDER)
 
-Important rules:
-- Always read a file before editing it.
-- Use the tools available to you rather than guessing at file contents.
-- Explain what you're doing before and after making changes.
-- Be cautious with bash commands — never run destructive commands."""
 
-# --- Tool Definitions (OpenAI format) ---
-
-TOOLS = [
-    {
-        "type": "function",
-        "function": {
-            "name": "read_file",
-            "description": "Read the contents of a file at the given path. Returns the file content as a string.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "path": {
-                        "type": "string",
-                        "description": "The path to the file to read",
-                    }
-                },
-                "required": ["path"],
-            },
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "list_files",
-            "description": "List files and directories at the given path. If no path is provided, lists the current directory.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "path": {
-                        "type": "string",
-                        "description": "The directory path to list (defaults to current directory)",
-                    }
-                },
-            },
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "edit_file",
-            "description": "Edit a file by replacing an exact string match. The old_string must appear exactly once in the file. Read the file first to get the exact content.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "path": {
-                        "type": "string",
-                        "description": "The path to the file to edit",
-                    },
-                    "old_string": {
-                        "type": "string",
-                        "description": "The exact string to find and replace",
-                    },
-                    "new_string": {
-                        "type": "string",
-                        "description": "The string to replace it with",
-                    },
-                },
-                "required": ["path", "old_string", "new_string"],
-            },
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "run_bash",
-            "description": "Run a bash command and return its stdout and stderr. Use this for running tests, installing packages, or other shell operations. Do not use for destructive commands like rm -rf.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "command": {
-                        "type": "string",
-                        "description": "The bash command to execute",
-                    }
-                },
-                "required": ["command"],
-            },
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "search_files",
-            "description": "Search for a regex pattern across files in a directory. Returns matching lines with file paths and line numbers.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "pattern": {
-                        "type": "string",
-                        "description": "The regex pattern to search for",
-                    },
-                    "path": {
-                        "type": "string",
-                        "description": "The directory to search in (defaults to current directory)",
-                    },
-                },
-                "required": ["pattern"],
-            },
-        },
-    },
-]
-
-
-# --- Tool Implementations ---
-
-
-def read_file(path: str) -> str:
-    """Read and return the contents of a file."""
-    try:
-        with open(path, "r") as f:
-            return f.read()
-    except Exception as e:
-        return f"Error reading file: {e}"
-
-
-def list_files(path: str = ".") -> str:
-    """List files and directories at the given path."""
-    try:
-        entries = os.listdir(path)
-        entries.sort()
-        result = []
-        for entry in entries:
-            full_path = os.path.join(path, entry)
-            if os.path.isdir(full_path):
-                result.append(f"[DIR]  {entry}")
-            else:
-                result.append(f"[FILE] {entry}")
-        return "\n".join(result) if result else "(empty directory)"
-    except Exception as e:
-        return f"Error listing files: {e}"
-
-
-def edit_file(path: str, old_string: str, new_string: str) -> str:
-    """Replace old_string with new_string in the file at path."""
-    try:
-        content = read_file(path)
-        if content.startswith("Error"):
-            return content
-
-        count = content.count(old_string)
-        if count == 0:
-            return "Error: old_string not found in file."
-        if count > 1:
-            return f"Error: old_string appears {count} times. Provide a more unique string."
-
-        new_content = content.replace(old_string, new_string, 1)
-        with open(path, "w") as f:
-            f.write(new_content)
-        return "File edited successfully."
-    except Exception as e:
-        return f"Error editing file: {e}"
-
-
-def run_bash(command: str) -> str:
-    """Run a bash command with basic safety checks."""
-    dangerous_patterns = ["rm -rf /", "rm -rf ~", "mkfs", "> /dev/sd", "dd if="]
-    for pattern in dangerous_patterns:
-        if pattern in command:
-            return f"Error: refusing to run potentially destructive command."
-
-    try:
-        result = subprocess.run(
-            command,
-            shell=True,
-            capture_output=True,
-            text=True,
-            timeout=30,
-        )
-        output = ""
-        if result.stdout:
-            output += result.stdout
-        if result.stderr:
-            output += ("" if not output else "\n") + f"STDERR: {result.stderr}"
-        if not output:
-            output = "(no output)"
-        return output
-    except subprocess.TimeoutExpired:
-        return "Error: command timed out after 30 seconds."
-    except Exception as e:
-        return f"Error running command: {e}"
-
-
-def search_files(pattern: str, path: str = ".") -> str:
-    """Search for a regex pattern in files under path."""
-    try:
-        regex = re.compile(pattern)
-    except re.error as e:
-        return f"Invalid regex pattern: {e}"
-
-    matches = []
-    for root, dirs, files in os.walk(path):
-        dirs[:] = [d for d in dirs if not d.startswith(".") and d not in ("node_modules", "__pycache__", "venv")]
-        for filename in files:
-            filepath = os.path.join(root, filename)
-            try:
-                with open(filepath, "r", errors="ignore") as f:
-                    for i, line in enumerate(f, 1):
-                        if regex.search(line):
-                            matches.append(f"{filepath}:{i}: {line.rstrip()}")
-                            if len(matches) >= 50:
-                                matches.append("(truncated at 50 matches)")
-                                return "\n".join(matches)
-            except (OSError, UnicodeDecodeError):
-                continue
-
-    return "\n".join(matches) if matches else "No matches found."
-
-
-def execute_tool(name: str, args: dict) -> str:
-    """Dispatch a tool call to the right function."""
-    if name == "read_file":
-        return read_file(args["path"])
-    elif name == "list_files":
-        return list_files(args.get("path", "."))
-    elif name == "edit_file":
-        return edit_file(args["path"], args["old_string"], args["new_string"])
-    elif name == "run_bash":
-        return run_bash(args["command"])
-    elif name == "search_files":
-        return search_files(args["pattern"], args.get("path", "."))
-    else:
-        return f"Unknown tool: {name}"
-
-
-# --- Agent Loop ---
-
-
-def agent_loop():
-    """Main conversation loop."""
-    messages = [{"role": "system", "content": SYSTEM_PROMPT}]
-
-    print("AI Coding Agent (type 'quit' to exit)")
-    print("=" * 40)
-
-    while True:
-        # Get user input
-        try:
-            user_input = input("\nYou: ").strip()
-        except (EOFError, KeyboardInterrupt):
-            print("\nGoodbye!")
-            break
-
-        if not user_input:
-            continue
-        if user_input.lower() in ("quit", "exit"):
-            print("Goodbye!")
-            break
-
-        # Add user message to conversation
-        messages.append({"role": "user", "content": user_input})
-
-        # Inner loop: keep going while the model wants to use tools
-        while True:
-            response = client.chat.completions.create(
-                model=MODEL,
-                max_tokens=MAX_TOKENS,
-                tools=TOOLS,
-                messages=messages,
-            )
-
-            message = response.choices[0].message
-
-            # Add assistant response to conversation history
-            messages.append(message)
-
-            if message.tool_calls:
-                # Process all tool calls in the response
-                for tool_call in message.tool_calls:
-                    import json
-                    args = json.loads(tool_call.function.arguments)
-                    print(f"  [tool] {tool_call.function.name}({args})")
-                    result = execute_tool(tool_call.function.name, args)
-                    messages.append(
-                        {
-                            "role": "tool",
-                            "tool_call_id": tool_call.id,
-                            "content": result,
-                        }
-                    )
-            else:
-                # Model is done — print text
-                if message.content:
-                    print(f"\nAgent: {message.content}")
-                break
+def main(provider=provider):
+    """Run the terminal REPL (agent_repl.py) against provider."""
+    agent_repl.main(provider)
 
 
 if __name__ == "__main__":
-    agent_loop()
+    main()
@@ -0,0 +1,177 @@
+"""
+Streaming helpers for the agent loop.
+
+The non-streaming loop blocks until the whole reply exists. These helpers
+print text as it arrives, rebuild tool calls from the streamed deltas and
+hand each tool call to a callback as soon as its arguments are complete,
+so the tool can start while the rest of the reply is still streaming.
+"""
+
+import json
+import time
+
+
+class TurnTimer:
+    """Measures time-to-first-token and total latency of one model turn."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.first_token = None
+        self.end = None
+
+    def mark_token(self):
+        if self.first_token is None:
+            self.first_token = time.perf_counter()
+
+    def finish(self):
+        self.end = time.perf_counter()
+
+    @property
+    def ttft(self):
+        if self.first_token is None:
+            return None
+        return self.first_token - self.start
+
+    @property
+    def total(self):
+        end = self.end if self.end is not None else time.perf_counter()
+        return end - self.start
+
+    def summary(self) -> str:
+        ttft = f"{self.ttft:.2f}s" if self.ttft is not None else "n/a"
+        return f"first token {ttft}, turn {self.total:.2f}s"
+
+
+# --- OpenAI format ---
+
+
+class OpenAIStreamAssembler:
+    """Rebuilds an assistant message from `chat.completions` stream chunks.
+
+    Tool call deltas arrive keyed by `index`; a call is complete once a delta
+    for a later index shows up or the stream ends. `on_tool_call(call, args)`
+    is invoked once per completed call, in order; args is None when the
+    arguments are not a JSON object.
+    """
+
+    def __init__(self, on_text=None, on_tool_call=None, timer=None):
+        self.on_text = on_text
+        self.on_tool_call = on_tool_call
+        self.timer = timer or TurnTimer()
+        self.text = []
+        self.tool_calls = {}
+        self.emitted = set()
+        self.usage = None
+
+    def feed(self, chunk):
+        if getattr(chunk, "usage", None):
+            self.usage = chunk.usage
+        if not chunk.choices:
+            return
+        delta = chunk.choices[0].delta
+
+        if delta.content:
+            self.timer.mark_token()
+            self.text.append(delta.content)
+            if self.on_text:
+                self.on_text(delta.content)
+
+        for tc in delta.tool_calls or []:
+            self.timer.mark_token()
+            # A delta for a new index means every earlier call is complete
+            for index in sorted(self.tool_calls):
+                if index < tc.index:
+                    self._emit(index)
+            call = self.tool_calls.setdefault(
+                tc.index,
+                {"id": "", "type": "function", "function": {"name": "", "arguments": ""}},
+            )
+            if tc.id:
+                call["id"] = tc.id
+            if tc.function:
+                if tc.function.name:
+                    call["function"]["name"] += tc.function.name
+                if tc.function.arguments:
+                    call["function"]["arguments"] += tc.function.arguments
+
+    def _emit(self, index):
+        if index in self.emitted:
+            return
+        self.emitted.add(index)
+        if self.on_tool_call:
+            call = self.tool_calls[index]
+            self.on_tool_call(call, parse_arguments(call["function"]["arguments"]))
+
+    def finish(self) -> dict:
+        """Flush pending tool calls and return the assistant message dict."""
+        for index in sorted(self.tool_calls):
+            self._emit(index)
+            call = self.tool_calls[index]
+            call["function"]["arguments"] = call["function"]["arguments"] or "{}"
+        self.timer.finish()
+        message = {"role": "assistant", "content": "".join(self.text) or None}
+        if self.tool_calls:
+            message["tool_calls"] = [self.tool_calls[i] for i in sorted(self.tool_calls)]
+        return message
+
+
+def parse_arguments(arguments: str):
+    """Parse a tool call's JSON arguments, treating empty input as no args.
+
+    None if they are not a JSON object: running the tool with no arguments
+    instead would hide the model's mistake from it.
+    """
+    if not arguments:
+        return {}
+    try:
+        args = json.loads(arguments)
+    except json.JSONDecodeError:
+        return None
+    return args if isinstance(args, dict) else None
+
+
+async def stream_openai(client, on_text=None, on_tool_call=None, **kwargs):
+    """Run one streamed chat completion on an AsyncOpenAI client.
+
+    Returns (message dict, TurnTimer, usage). usage is None unless the
+    provider sends it in the stream.
+    """
+    assembler = OpenAIStreamAssembler(on_text=on_text, on_tool_call=on_tool_call)
+    async for chunk in await client.chat.completions.create(stream=True, **kwargs):
+        assembler.feed(chunk)
+    return assembler.finish(), assembler.timer, assembler.usage
+
+
+# --- Anthropic format ---
+
+
+def handle_anthropic_event(event, timer, on_text=None, on_tool_call=None):
+    """Handle one event from `client.messages.stream()`.
+
+    The SDK's stream helper already accumulates blocks, so a `tool_use`
+    block is complete (with parsed input) at its `content_block_stop`.
+    """
+    if event.type == "text":
+        timer.mark_token()
+        if on_text:
+            on_text(event.text)
+    elif event.type == "input_json":
+        timer.mark_token()
+    elif event.type == "content_block_stop":
+        block = event.content_block
+        if block.type == "tool_use" and on_tool_call:
+            on_tool_call(block)
+
+
+async def stream_anthropic(client, on_text=None, on_tool_call=None, **kwargs):
+    """Run one streamed Messages API call on an AsyncAnthropic client.
+
+    Returns (final message, TurnTimer).
+    """
+    timer = TurnTimer()
+    async with client.messages.stream(**kwargs) as stream:
+        async for event in stream:
+            handle_anthropic_event(event, timer, on_text, on_tool_call)
+        message = await stream.get_final_message()
+    timer.finish()
+    return message, timer
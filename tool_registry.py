@@ -0,0 +1,284 @@
+"""
+Table-driven tool registry.
+
+Tools are plain functions registered with a decorator:
+
+    tools = ToolRegistry()
+
+    @tools.tool("Read a file.", read_only=True, params={"path": "The file to read"})
+    def read_file(path: str, offset: int = None) -> str:
+        ...
+
+The JSON schema the model sees is built once, at import, from the
+function's signature: each parameter becomes a property typed from its
+annotation, and parameters without a default are required. `params` gives
+each property its description, or a dict of extra schema keys (e.g. `items`
+for a list). The schema is compiled into a validator at the same time, so a
+call only looks the tool up in a dict, checks its arguments and calls it.
+
+Each tool also declares whether it is read-only, which argument names the
+path it touches, and a timeout. The tool scheduler uses the first two to
+decide what may run concurrently; `run()` enforces the third.
+"""
+
+import asyncio
+import contextvars
+import functools
+import inspect
+import os
+
+JSON_TYPES = {str: "string", int: "integer", float: "number", bool: "boolean", list: "array", dict: "object"}
+# A tool that enforces its own timeout (run_bash) gets this long to report it
+TIMEOUT_GRACE = 5
+
+
+class ToolArgumentError(Exception):
+    """Arguments that do not match a tool's schema; the message is shown to the model."""
+
+
+# --- Validators ---
+
+
+def _check_string(value, where):
+    if not isinstance(value, str):
+        raise ToolArgumentError(f"{where} must be a string")
+    return value
+
+
+def _check_integer(value, where):
+    if isinstance(value, bool):
+        raise ToolArgumentError(f"{where} must be an integer")
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str) and value.strip().lstrip("-").isdigit():
+        return int(value)  # some models quote numbers
+    raise ToolArgumentError(f"{where} must be an integer")
+
+
+def _check_number(value, where):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ToolArgumentError(f"{where} must be a number") from None
+
+
+def _check_boolean(value, where):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.lower() in ("true", "false"):
+        return value.lower() == "true"
+    raise ToolArgumentError(f"{where} must be true or false")
+
+
+def compile_schema(schema: dict):
+    """A function (value, where) -> value that checks value against schema.
+
+    Covers what tool schemas here use: type, properties, required, items.
+    Values may be converted (e.g. "5" to 5 for an integer).
+    """
+    kind = schema.get("type")
+    if kind == "string":
+        return _check_string
+    if kind == "integer":
+        return _check_integer
+    if kind == "number":
+        return _check_number
+    if kind == "boolean":
+        return _check_boolean
+    if kind == "array":
+        check_item = compile_schema(schema.get("items", {}))
+
+        def check_array(value, where):
+            if not isinstance(value, list):
+                raise ToolArgumentError(f"{where} must be an array")
+            return [check_item(item, f"{where}[{i}]") for i, item in enumerate(value)]
+
+        return check_array
+    if kind == "object":
+        checks = {name: compile_schema(prop) for name, prop in schema.get("properties", {}).items()}
+        required = schema.get("required", [])
+
+        def check_object(value, where):
+            if not isinstance(value, dict):
+                raise ToolArgumentError(f"{where} must be an object")
+            for name in required:
+                if value.get(name) is None:
+                    raise ToolArgumentError(f"{where} is missing {name}")
+            return {
+                name: checks[name](item, f"{where}.{name}") if name in checks else item
+                for name, item in value.items()
+            }
+
+        return check_object
+    return lambda value, where: value
+
+
+# --- Registry ---
+
+
+class ToolSpec:
+    """One registered tool: its function, schema, validator and metadata."""
+
+    def __init__(self, func, description: str, params: dict, read_only: bool, timeout, path_arg, async_func):
+        self.func = func
+        self.name = func.__name__
+        self.description = description
+        self.read_only = read_only
+        self.timeout = timeout
+        self.async_func = async_func
+
+        self.properties = {}
+        self.required = []
+        self.defaults = {}
+        self._checks = {}
+        for name, param in inspect.signature(func).parameters.items():
+            extra = params.get(name, {})
+            if isinstance(extra, str):
+                extra = {"description": extra}
+            prop = {"type": JSON_TYPES.get(param.annotation, "string"), **extra}
+            self.properties[name] = prop
+            self._checks[name] = compile_schema(prop)
+            if param.default is inspect.Parameter.empty:
+                self.required.append(name)
+            else:
+                self.defaults[name] = param.default
+        self.path_arg = path_arg if path_arg is not None else ("path" if "path" in self.properties else None)
+
+    @property
+    def parameters(self) -> dict:
+        schema = {"type": "object", "properties": self.properties}
+        if self.required:
+            schema["required"] = self.required
+        return schema
+
+    def bind(self, args: dict) -> dict:
+        """The keyword arguments for a call. Raises ToolArgumentError.
+
+        Unknown arguments are dropped and nulls mean "use the default".
+        """
+        if not isinstance(args, dict):
+            raise ToolArgumentError(f"{self.name}: arguments must be an object")
+        kwargs = {}
+        for name, check in self._checks.items():
+            value = args.get(name)
+            if value is None:
+                if name in self.defaults:
+                    continue
+                raise ToolArgumentError(f"{self.name}: missing required argument {name}")
+            kwargs[name] = check(value, f"{self.name}: {name}")
+        return kwargs
+
+
+class ToolRegistry:
+    """Tools by name, with their schemas in each provider's format."""
+
+    def __init__(self):
+        self.tools = {}
+
+    def tool(
+        self,
+        description: str,
+        params: dict = None,
+        read_only: bool = False,
+        timeout: float = None,
+        path_arg: str = None,
+        async_func=None,
+    ):
+        """Register the decorated function as a tool.
+
+        `path_arg` names the argument holding the path the tool touches
+        (default "path" if there is one; without one a call may touch
+        anything). `async_func`, if given, is a coroutine function with the
+        same signature that run() awaits instead of using a thread.
+        Give mutating tools a timeout only if they enforce it themselves: an
+        abandoned thread keeps running, and the scheduler would let the next
+        edit to the same file start alongside it.
+        """
+
+        def register(func):
+            spec = ToolSpec(func, description, params or {}, read_only, timeout, path_arg, async_func)
+            if spec.name in self.tools:
+                raise ValueError(f"tool {spec.name} registered twice")
+            self.tools[spec.name] = spec
+            return func
+
+        return register
+
+    def __getitem__(self, name: str) -> ToolSpec:
+        return self.tools[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.tools
+
+    # --- Schemas ---
+
+    def openai_schemas(self) -> list:
+        return [
+            {
+                "type": "function",
+                "function": {"name": spec.name, "description": spec.description, "parameters": spec.parameters},
+            }
+            for spec in self.tools.values()
+        ]
+
+    def anthropic_schemas(self) -> list:
+        return [
+            {"name": spec.name, "description": spec.description, "input_schema": spec.parameters}
+            for spec in self.tools.values()
+        ]
+
+    # --- Metadata for schedulers and caches ---
+
+    def read_only_tools(self) -> set:
+        return {name for name, spec in self.tools.items() if spec.read_only}
+
+    def tool_path(self, name: str, args: dict):
+        """The absolute path a call touches, or None for "anything"."""
+        spec = self.tools.get(name)
+        if spec is None or spec.path_arg is None:
+            return None
+        value = args.get(spec.path_arg) if isinstance(args, dict) else None
+        if value is None:
+            value = spec.defaults.get(spec.path_arg, "")
+        return os.path.abspath(str(value))
+
+    # --- Dispatch ---
+
+    def call(self, name: str, args: dict) -> str:
+        """Run a tool in this thread."""
+        spec = self.tools.get(name)
+        if spec is None:
+            return f"Unknown tool: {name}"
+        try:
+            kwargs = spec.bind(args)
+        except ToolArgumentError as e:
+            return f"Error: {e}."
+        return spec.func(**kwargs)
+
+    async def run(self, name: str, args: dict, executor=None) -> str:
+        """Run a tool without blocking the event loop: its async_func, or
+        its function on `executor`. A tool past its timeout is abandoned
+        (a thread cannot be stopped) and an error returned."""
+        spec = self.tools.get(name)
+        if spec is None:
+            return f"Unknown tool: {name}"
+        try:
+            kwargs = spec.bind(args)
+        except ToolArgumentError as e:
+            return f"Error: {e}."
+        if spec.async_func is not None:
+            pending = spec.async_func(**kwargs)
+        else:
+            loop = asyncio.get_running_loop()
+            context = contextvars.copy_context()  # carries current_session into the thread
+            pending = loop.run_in_executor(executor, context.run, functools.partial(spec.func, **kwargs))
+        if not spec.timeout:
+            return await pending
+        try:
+            return await asyncio.wait_for(pending, spec.timeout + TIMEOUT_GRACE)
+        except asyncio.TimeoutError:
+            return f"Error: {name} did not finish within {spec.timeout:g}s."
@@ -0,0 +1,85 @@
+"""
+Concurrent execution of the tool calls in one assistant turn.
+
+Read-only tools run concurrently. A mutating tool waits for every earlier
+call that touches the same path, and later calls on that path wait for it,
+so edits to one file still happen one at a time and in order. `run_bash`
+can touch anything, so it acts as a barrier. Results always come back in
+the order the model issued the calls.
+
+Which tools are read-only and which path a call touches come from the tool
+registry (tool_registry.py) when there is one; the defaults below describe
+the workshop's six tools.
+"""
+
+import asyncio
+import os
+
+READ_ONLY_TOOLS = {"read_file", "list_files", "search_files"}
+
+
+def tool_path(name: str, args: dict):
+    """Return the absolute path a tool call touches, or None for "anything"."""
+    if name in ("read_file", "edit_file"):
+        return os.path.abspath(args.get("path", ""))
+    if name in ("list_files", "search_files"):
+        return os.path.abspath(args.get("path", "."))
+    return None
+
+
+def paths_overlap(a, b) -> bool:
+    """True if one path is the other or contains it. None overlaps everything."""
+    if a is None or b is None:
+        return True
+    return a == b or a.startswith(b + os.sep) or b.startswith(a + os.sep)
+
+
+class ToolScheduler:
+    """Schedules one turn's tool calls as asyncio tasks.
+
+    `execute_tool` is a coroutine function (name, args) -> str. Create one
+    scheduler per assistant turn. Calls can be submitted while the reply
+    is still streaming; each waits only on earlier calls it conflicts with.
+    """
+
+    def __init__(self, execute_tool, read_only=READ_ONLY_TOOLS, tool_path=tool_path):
+        self.execute_tool = execute_tool
+        self.read_only = read_only
+        self.tool_path = tool_path
+        self.submitted = []  # (path, mutating, task) in submission order
+
+    def submit(self, name: str, args: dict) -> asyncio.Task:
+        """Start a tool call once its conflicting predecessors finish."""
+        path = self.tool_path(name, args)
+        mutating = name not in self.read_only
+        deps = [
+            task
+            for other_path, other_mutating, task in self.submitted
+            if (mutating or other_mutating) and paths_overlap(path, other_path)
+        ]
+        task = asyncio.ensure_future(self._run(deps, name, args))
+        self.submitted.append((path, mutating, task))
+        return task
+
+    async def _run(self, deps, name, args):
+        if deps:
+            await asyncio.wait(deps)
+        try:
+            return await self.execute_tool(name, args)
+        except Exception as e:
+            return f"Error running {name}: {e}"
+
+    async def cancel(self):
+        """Cancel the calls still running and wait until they have stopped.
+
+        A tool running on a thread cannot be stopped; its result is dropped.
+        """
+        running = [task for _, _, task in self.submitted if not task.done()]
+        for task in running:
+            task.cancel()
+        if running:
+            await asyncio.wait(running)
+
+    async def run_all(self, calls) -> list:
+        """Run a list of (name, args) calls and return results in order."""
+        return await asyncio.gather(*(self.submit(name, args) for name, args in calls))
@@ -0,0 +1,263 @@
+"""
+Tracing for model and tool calls.
+
+Each user turn is a span, with a child span for every model call and every
+tool call in it. A span records its duration, the bytes sent and received,
+token usage (from the response's `usage`) and any error. Finished spans can
+be streamed to a JSONL file, written out as OpenTelemetry OTLP/JSON (which
+OTel collectors and most trace viewers import), and summarised in a table:
+calls, time and tokens per model and per tool. That is usually enough to
+tell whether a slow session is waiting on the model, on search_files or on
+run_bash.
+"""
+
+import contextlib
+import json
+import math
+import os
+import random
+import secrets
+import sys
+import threading
+import time
+from collections import deque
+
+TOKEN_FIELDS = (
+    "prompt_tokens",
+    "completion_tokens",
+    "input_tokens",
+    "output_tokens",
+    "cache_read_input_tokens",
+    "cache_creation_input_tokens",
+)
+RESERVOIR = 1024  # durations sampled per model or tool, for the p95
+
+
+class Durations:
+    """Count, total and max of every duration added, plus a uniform sample of
+    at most RESERVOIR of them for percentiles, so memory stays bounded however
+    long the process runs."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.sample = []
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        if len(self.sample) < RESERVOIR:
+            self.sample.append(seconds)
+        else:
+            slot = random.randrange(self.count)  # reservoir sampling: each duration kept with equal odds
+            if slot < RESERVOIR:
+                self.sample[slot] = seconds
+
+    def percentile(self, fraction: float) -> float:
+        ordered = sorted(self.sample)
+        return ordered[min(len(ordered) - 1, math.ceil(fraction * len(ordered)) - 1)]
+
+
+class Span:
+    """One timed operation: a turn, a model call or a tool call."""
+
+    def __init__(self, kind: str, name: str, trace_id: str, parent_id, attributes: dict):
+        self.kind = kind
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start = time.time()
+        self.duration = None
+        self.bytes_in = 0  # sent: a request, or a tool's arguments
+        self.bytes_out = 0  # received: a reply, or a tool's result
+        self.usage = {}
+        self.error = None
+        self._started = time.perf_counter()
+
+    def set_usage(self, usage):
+        """Copy token counts from an SDK usage object or dict."""
+        for field in TOKEN_FIELDS:
+            value = usage.get(field) if isinstance(usage, dict) else getattr(usage, field, None)
+            if isinstance(value, int):
+                self.usage[field] = value
+
+    @property
+    def tokens_in(self) -> int:
+        u = self.usage
+        return u.get("prompt_tokens", 0) + u.get("input_tokens", 0) + u.get("cache_read_input_tokens", 0) + u.get(
+            "cache_creation_input_tokens", 0
+        )
+
+    @property
+    def tokens_out(self) -> int:
+        return self.usage.get("completion_tokens", 0) + self.usage.get("output_tokens", 0)
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "kind": self.kind,
+            "name": self.name,
+            "start": self.start,
+            "duration_s": round(self.duration, 6),
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "usage": self.usage,
+            "error": self.error,
+            **self.attributes,
+        }
+
+    def to_otlp(self) -> dict:
+        """The span in OTLP/JSON form, with GenAI semantic-convention names."""
+        attributes = {"agent.span.kind": self.kind, "agent.bytes_in": self.bytes_in, "agent.bytes_out": self.bytes_out}
+        if self.kind == "model":
+            attributes["gen_ai.request.model"] = self.name
+            attributes["gen_ai.usage.input_tokens"] = self.tokens_in
+            attributes["gen_ai.usage.output_tokens"] = self.tokens_out
+        elif self.kind == "tool":
+            attributes["gen_ai.tool.name"] = self.name
+        attributes.update({f"agent.{key}": value for key, value in self.attributes.items()})
+
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": {"model": f"chat {self.name}", "tool": f"execute_tool {self.name}"}.get(self.kind, self.name),
+            "kind": 3 if self.kind == "model" else 1,  # CLIENT, INTERNAL
+            "startTimeUnixNano": str(int(self.start * 1e9)),
+            "endTimeUnixNano": str(int((self.start + self.duration) * 1e9)),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 0},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class Tracer:
+    """Collects finished spans; streams them to `jsonl_path` if given.
+
+    A disabled tracer still hands out spans, so callers need no checks, but
+    keeps nothing. `recording` tells callers whether measuring sizes is
+    worth the cost.
+    """
+
+    def __init__(self, enabled: bool = True, jsonl_path: str = None, max_spans: int = 100_000):
+        self.recording = enabled
+        self.jsonl_path = jsonl_path
+        self.spans = deque(maxlen=max_spans)  # for OTLP export; the summary covers every span
+        self.stats = {}  # (kind, name) -> [calls, Durations, bytes in, bytes out, tokens in, tokens out, errors]
+        self.lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def span(self, kind: str, name: str, trace_id: str = None, parent: Span = None, **attributes):
+        """Time the body as a span. Exceptions are recorded and re-raised."""
+        span = Span(
+            kind,
+            name,
+            trace_id or (parent.trace_id if parent else secrets.token_hex(16)),
+            parent.span_id if parent else None,
+            attributes,
+        )
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.duration = time.perf_counter() - span._started
+            if self.recording:
+                self._record(span)
+
+    def _record(self, span: Span):
+        line = json.dumps(span.to_dict()) if self.jsonl_path else None
+        with self.lock:
+            self.spans.append(span)
+            stats = self.stats.setdefault((span.kind, span.name), [0, Durations(), 0, 0, 0, 0, 0])
+            stats[0] += 1
+            stats[1].add(span.duration)
+            stats[2] += span.bytes_in
+            stats[3] += span.bytes_out
+            stats[4] += span.tokens_in
+            stats[5] += span.tokens_out
+            stats[6] += 1 if span.error else 0
+            if line is not None:
+                with open(self.jsonl_path, "a") as f:
+                    f.write(line + "\n")
+
+    def export_otlp(self, path: str, service_name: str = "coding-agent"):
+        """Write the kept spans as an OTLP/JSON ExportTraceServiceRequest."""
+        with self.lock:
+            spans = [span.to_otlp() for span in self.spans]
+        body = {
+            "resourceSpans": [
+                {
+                    "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]},
+                    "scopeSpans": [{"scope": {"name": "agent.tracing"}, "spans": spans}],
+                }
+            ]
+        }
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(body, f)
+        os.replace(tmp, path)
+
+    def summary_table(self) -> str:
+        """Calls, time, bytes and tokens per model and tool, slowest first."""
+        header = (
+            f"{'kind':<6}{'name':<22}{'calls':>6}{'total':>9}{'mean':>8}{'p95':>8}"
+            f"{'max':>8}{'in KB':>9}{'out KB':>9}{'tok in':>10}{'tok out':>9}{'errors':>7}"
+        )
+        lines = [header, "-" * len(header)]
+        with self.lock:
+            rows = sorted(self.stats.items(), key=lambda item: (item[0][0] != "model", -item[1][1].total))
+            for (kind, name), (calls, durations, bytes_in, bytes_out, tokens_in, tokens_out, errors) in rows:
+                if kind == "turn":
+                    continue
+                total, p95 = durations.total, durations.percentile(0.95)
+                lines.append(
+                    f"{kind:<6}{name[:21]:<22}{calls:>6}{total:>8.2f}s{total / calls:>7.2f}s{p95:>7.2f}s"
+                    f"{durations.max:>7.2f}s{bytes_in / 1024:>9.1f}{bytes_out / 1024:>9.1f}"
+                    f"{tokens_in:>10,}{tokens_out:>9,}{errors:>7}"
+                )
+            turns = self.stats.get(("turn", "turn"))
+        if turns:
+            lines.append(f"{turns[0]} turns, {turns[1].total:.2f}s in total")
+        return "\n".join(lines)
+
+
+DISABLED = Tracer(enabled=False)
+
+
+def tracer_from_env() -> Tracer:
+    """A Tracer configured by TRACE / TRACE_FILE / TRACE_OTLP, or DISABLED."""
+    jsonl_path = os.getenv("TRACE_FILE") or None
+    if os.getenv("TRACE", "0") == "1" or jsonl_path or os.getenv("TRACE_OTLP"):
+        return Tracer(jsonl_path=jsonl_path)
+    return DISABLED
+
+
+def finish_tracing(tracer: Tracer):
+    """End of a run: write the OTLP file and print the summary, if enabled."""
+    if not tracer.recording:
+        return
+    otlp_path = os.getenv("TRACE_OTLP")
+    if otlp_path:
+        tracer.export_otlp(otlp_path)
+    # stderr, so that a batch run writing results to stdout keeps it pure JSONL
+    print(file=sys.stderr)
+    print(tracer.summary_table(), file=sys.stderr)
@@ -0,0 +1,353 @@
+"""
+Persistent trigram index for search_files.
+
+Every file in the workspace is broken into 3-byte trigrams. A regex search
+first pulls the literal strings the pattern requires (for `def\\s+load_` that
+is "def" and "load_"), looks up which files contain all of their trigrams,
+and only runs the regex on those. The index is saved to disk and refreshed
+incrementally: only files whose mtime or size changed are re-read, and only
+those changes are appended to the saved index. While a
+file watcher (workspace_watch.py) covers the root, the refresh walk is
+skipped until the watcher reports a change under it.
+"""
+
+import hashlib
+import os
+import pickle
+import threading
+from array import array
+from bisect import bisect_left
+
+try:
+    import re._parser as sre_parse
+    import re._constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_constants
+
+INDEX_DIR = os.getenv("SEARCH_INDEX_DIR", os.path.expanduser("~/.cache/agent-search-index"))
+MAX_INDEXED_BYTES = 4 * 1024 * 1024  # larger files are always searched
+MAX_ALTERNATIVES = 32
+FORMAT_VERSION = 2
+JOURNAL_RATIO = 0.25  # rewrite the snapshot once the journal is this big relative to it
+
+_REPEATS = {sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT}
+if hasattr(sre_constants, "POSSESSIVE_REPEAT"):
+    _REPEATS.add(sre_constants.POSSESSIVE_REPEAT)
+
+
+def trigrams(data: bytes) -> set:
+    """Return the set of lowercased 3-byte substrings of data."""
+    data = data.lower()
+    return {data[i : i + 3] for i in range(len(data) - 2)}
+
+
+# --- Query extraction ---
+
+
+def _literal_char(code: int, ignorecase: bool):
+    """Return the character for a LITERAL opcode if it is safe to index on."""
+    char = chr(code)
+    if char in "\r\n":
+        return None
+    # Case-insensitive matching folds non-ASCII letters, and "k"/"s" also
+    # match the Kelvin sign and long s, which a bytes lower() cannot see.
+    if ignorecase and (not char.isascii() or char in "kKsS"):
+        return None
+    return char
+
+
+def _alternatives(subpattern, ignorecase: bool) -> list:
+    """Literal strings a match must contain, as a list of alternatives.
+
+    Each alternative is a list of strings that must all appear; a match
+    satisfies at least one alternative. `[[]]` means "no constraint".
+    """
+    alts = [[]]
+    run = []
+
+    def flush():
+        if run:
+            literal = "".join(run)
+            for alt in alts:
+                alt.append(literal)
+            run.clear()
+
+    for op, av in subpattern:
+        if op is sre_constants.LITERAL:
+            char = _literal_char(av, ignorecase)
+            if char is not None:
+                run.append(char)
+                continue
+        flush()
+
+        if op is sre_constants.SUBPATTERN:
+            add_flags, del_flags, inner = av[1], av[2], av[3]
+            group_icase = (ignorecase or bool(add_flags & sre_constants.SRE_FLAG_IGNORECASE)) and not (
+                del_flags & sre_constants.SRE_FLAG_IGNORECASE
+            )
+            sub = _alternatives(inner, group_icase)
+        elif op is sre_constants.BRANCH:
+            sub = [alt for branch in av[1] for alt in _alternatives(branch, ignorecase)]
+        elif op in _REPEATS and av[0] >= 1:
+            sub = _alternatives(av[2], ignorecase)
+        else:
+            continue
+
+        combined = [a + b for a in alts for b in sub]
+        if len(combined) <= MAX_ALTERNATIVES:
+            alts = combined
+    flush()
+    return alts
+
+
+def query_for(regex):
+    """Return a list of trigram sets (one per alternative), or None if the
+    pattern cannot narrow the candidate files."""
+    try:
+        parsed = sre_parse.parse(regex.pattern, regex.flags)
+    except Exception:
+        return None
+    ignorecase = bool(parsed.state.flags & sre_constants.SRE_FLAG_IGNORECASE)
+
+    query = []
+    for alt in _alternatives(parsed, ignorecase):
+        grams = set()
+        for literal in alt:
+            grams |= trigrams(literal.encode("utf-8"))
+        if not grams:
+            return None
+        query.append(grams)
+    return query
+
+
+# --- Index ---
+
+
+def _read_keys(filepath: str):
+    """The sorted trigram keys of a file, or None if it is not indexed (binary, too big, unreadable)."""
+    try:
+        with open(filepath, "rb") as f:
+            data = f.read(MAX_INDEXED_BYTES + 1)
+    except OSError:
+        return None
+    if len(data) > MAX_INDEXED_BYTES or b"\0" in data[:8192]:
+        return None
+    return array("I", sorted(int.from_bytes(gram, "big") for gram in trigrams(data)))
+
+
+class TrigramIndex:
+    """Trigram index of the files under one directory.
+
+    `walk` yields file paths under the root in search order, so candidate
+    files come back in exactly the order an unindexed search visits them.
+
+    Files are numbered, and a trigram's postings are an array of file ids
+    in ascending order. Each file also keeps the array of its own trigrams,
+    so a changed file is taken out of just the postings it is in, and put
+    back under a new, higher id, which keeps every array sorted by appending.
+    On disk the index is a snapshot plus a journal of the files added and
+    removed since; the snapshot is only rewritten once the journal grows to
+    a quarter of its size.
+    """
+
+    def __init__(self, root: str, walk):
+        self.root = root
+        self.walk = walk
+        name = hashlib.sha1(os.path.abspath(root).encode()).hexdigest()
+        self.snapshot_path = os.path.join(INDEX_DIR, name + ".pkl")
+        self.journal_path = os.path.join(INDEX_DIR, name + ".journal")
+        self.lock = threading.Lock()
+        self.files = {}  # filepath -> (file id, mtime_ns, size), in walk order
+        self.keys = {}  # file id -> array of the file's trigram keys
+        self.postings = {}  # trigram key -> array of file ids, ascending
+        self.unindexed = set()  # ids of binary or oversized files, always candidates
+        self.next_id = 0
+        self.generation = None  # ties the journal to the snapshot it follows
+        self.snapshot_bytes = 0
+        self.journal_bytes = 0
+        self.stale = True  # something may have changed since the last refresh
+        self._load()
+
+    # --- Changes ---
+
+    def _remove(self, filepath: str):
+        entry = self.files.pop(filepath, None)
+        if entry is None:
+            return
+        file_id = entry[0]
+        self.unindexed.discard(file_id)
+        for key in self.keys.pop(file_id, ()):
+            ids = self.postings[key]
+            i = bisect_left(ids, file_id)
+            if i < len(ids) and ids[i] == file_id:
+                del ids[i]
+            if not ids:
+                del self.postings[key]
+
+    def _add(self, filepath: str, file_id: int, mtime: int, size: int, keys):
+        self.files[filepath] = (file_id, mtime, size)
+        self.next_id = max(self.next_id, file_id + 1)
+        if keys is None:
+            self.unindexed.add(file_id)
+            return
+        self.keys[file_id] = keys
+        for key in keys:
+            ids = self.postings.get(key)
+            if ids is None:
+                self.postings[key] = array("I", (file_id,))
+            else:
+                ids.append(file_id)
+
+    def _apply(self, record):
+        if record[0] == "remove":
+            self._remove(record[1])
+        else:
+            self._add(*record[1:])
+
+    # --- Persistence ---
+
+    def _load(self):
+        try:
+            with open(self.snapshot_path, "rb") as f:
+                state = pickle.load(f)
+                self.snapshot_bytes = f.tell()
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+            return
+        if state.get("version") != FORMAT_VERSION:
+            return
+        self.files = state["files"]
+        self.keys = state["keys"]
+        self.postings = state["postings"]
+        self.unindexed = state["unindexed"]
+        self.next_id = state["next_id"]
+        self.generation = state["generation"]
+        try:
+            with open(self.journal_path, "rb") as f:
+                if pickle.load(f) != ("generation", self.generation):
+                    self.journal_bytes = self.snapshot_bytes  # a journal of another snapshot: rewrite
+                    return
+                while True:
+                    try:
+                        record = pickle.load(f)
+                    except EOFError:
+                        break
+                    except (pickle.UnpicklingError, AttributeError, ValueError):
+                        self.journal_bytes = self.snapshot_bytes  # cut short by a crash: rewrite
+                        return
+                    self._apply(record)
+                self.journal_bytes = f.tell()
+        except (OSError, EOFError, pickle.UnpicklingError):
+            self.journal_bytes = self.snapshot_bytes
+
+    def _save(self, records: list):
+        """Record changes: append them to the journal, or write a new snapshot."""
+        os.makedirs(INDEX_DIR, exist_ok=True)
+        if self.generation is not None and self.journal_bytes < self.snapshot_bytes * JOURNAL_RATIO:
+            with open(self.journal_path, "ab") as f:
+                for record in records:
+                    pickle.dump(record, f, protocol=pickle.HIGHEST_PROTOCOL)
+                self.journal_bytes = f.tell()
+            return
+        self.generation = os.urandom(8).hex()
+        state = {
+            "version": FORMAT_VERSION,
+            "generation": self.generation,
+            "files": self.files,
+            "keys": self.keys,
+            "postings": self.postings,
+            "unindexed": self.unindexed,
+            "next_id": self.next_id,
+        }
+        tmp = f"{self.snapshot_path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            self.snapshot_bytes = f.tell()
+        os.replace(tmp, self.snapshot_path)
+        with open(self.journal_path, "wb") as f:
+            pickle.dump(("generation", self.generation), f, protocol=pickle.HIGHEST_PROTOCOL)
+            self.journal_bytes = f.tell()
+
+    # --- Refresh and lookup ---
+
+    def refresh(self) -> int:
+        """Re-index files whose mtime or size changed. Returns how many changed."""
+        seen = []
+        changed = []
+        for filepath in self.walk(self.root):
+            try:
+                st = os.stat(filepath)
+            except OSError:
+                continue
+            seen.append(filepath)
+            entry = self.files.get(filepath)
+            if entry is None or entry[1] != st.st_mtime_ns or entry[2] != st.st_size:
+                changed.append((filepath, st.st_mtime_ns, st.st_size))
+
+        present = set(seen)
+        records = [("remove", filepath) for filepath in self.files if filepath not in present]
+        for record in records:
+            self._remove(record[1])
+        for filepath, mtime, size in changed:
+            self._remove(filepath)
+            record = ("add", filepath, self.next_id, mtime, size, _read_keys(filepath))
+            self._apply(record)
+            records.append(record)
+        if records:
+            self.files = {filepath: self.files[filepath] for filepath in seen}  # back in walk order
+            self._save(records)
+        return len(records)
+
+    def candidates(self, regex) -> list:
+        """Refresh, then return the files that might match regex, in walk order."""
+        with self.lock:
+            if self.stale or _trusted is None or not _trusted(os.path.realpath(self.root)):
+                self.stale = False  # a change reported during the walk sets it again
+                self.refresh()
+            query = query_for(regex)
+            if query is None:
+                return list(self.files)
+
+            matched = set(self.unindexed)
+            for grams in query:
+                postings = sorted((self.postings.get(int.from_bytes(gram, "big"), ()) for gram in grams), key=len)
+                if not postings[0]:
+                    continue
+                hits = set(postings[0])
+                for ids in postings[1:]:
+                    hits.intersection_update(ids)
+                    if not hits:
+                        break
+                matched |= hits
+            return [filepath for filepath, entry in self.files.items() if entry[0] in matched]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+_trusted = None  # directory -> bool: a watcher reports every change under it
+
+
+def set_trusted(trusted):
+    """Let indexes skip their refresh walk for roots `trusted(root)` accepts."""
+    global _trusted
+    _trusted = trusted
+
+
+def mark_changed(path: str):
+    """A file watcher saw path change: the indexes holding it must refresh."""
+    path = os.path.realpath(path)
+    with _indexes_lock:
+        indexes = list(_indexes.values())
+    for index in indexes:
+        root = os.path.realpath(index.root)
+        if path == root or path.startswith(root.rstrip(os.sep) + os.sep) or root.startswith(path + os.sep):
+            index.stale = True
+
+
+def get_index(root: str, walk) -> TrigramIndex:
+    """Return the shared index for root, loading it from disk on first use."""
+    key = (root, os.path.abspath(root))
+    with _indexes_lock:
+        if key not in _indexes:
+            _indexes[key] = TrigramIndex(root, walk)
+        return _indexes[key]
@@ -30,6 +30,8 @@ For other providers, set these environment variables:
     export MODEL="claude-sonnet-4-20250514"
 """
 
+import importlib.metadata
+import importlib.util
 import os
 import sys
 
@@ -52,14 +54,13 @@ def main():
 
     # Step 2: Check OpenAI SDK installed
     print("[2/4] Checking OpenAI SDK...")
-    try:
-        from openai import OpenAI
-        import openai
-        print(f"      ✓ openai {openai.__version__} installed")
-    except ImportError:
+    # Look the package up without importing it: the import takes a while,
+    # and only the test request in step 4 needs it
+    if importlib.util.find_spec("openai") is None:
         print("      ✗ OpenAI SDK not installed")
         print("        Run: pip install openai")
         return False
+    print(f"      ✓ openai {importlib.metadata.version('openai')} installed")
     print()
 
     # Step 3: Check API key
@@ -94,6 +95,8 @@ def main():
     print()
 
     try:
+        from openai import OpenAI
+
         client = OpenAI(api_key=api_key, base_url=base_url)
         response = client.chat.completions.create(
             model=model,
@@ -0,0 +1,283 @@
+"""
+Workspace watcher: tells the caches when files change outside the agent.
+
+The read cache, the list_files tree snapshot and the trigram index all keep
+state about files that the user (or their IDE, or a build) can change at
+any time. A Watcher follows the workspace and calls `on_change(path,
+is_dir)` for every file or directory that was created, written, deleted or
+moved, so those entries are dropped before anyone is served stale content.
+
+On Linux it uses inotify (through ctypes, no dependencies), with one watch
+per directory. The tree is walked and watched on the background thread, so
+`start()` returns at once; while inotify covers a directory, the list_files
+tree and the trigram index may trust their entries for it without walking
+it again: `covers(path)` says which directories that is. (The read cache
+still stats every file, as events arrive only some time after the write.) Without inotify, or with more directories than
+the watch limit, the watcher turns itself off and the caches keep checking;
+`force_poll` polls mtimes instead, which notices changes late, so nothing is
+trusted then either. When the kernel's event queue overflows, and once the
+first walk is done, `on_change(root, True)` tells the caches to drop
+everything under the root.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+
+IN_MODIFY = 0x2
+IN_ATTRIB = 0x4
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_MOVE_SELF = 0x800
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (
+    IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+)
+EVENT = struct.Struct("iIII")  # wd, mask, cookie, len; then the name
+
+# Not watched, as search_files does not look inside them either
+SKIP_DIRS = {"node_modules", "__pycache__", "venv"}
+MAX_WATCHES = 8192
+MAX_POLLED = 200_000
+
+
+def _skipped(name: str) -> bool:
+    return name.startswith(".") or name in SKIP_DIRS
+
+
+class _Inotify:
+    """Thin ctypes wrapper over the inotify syscalls."""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add = libc.inotify_add_watch
+        self._add.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._rm = libc.inotify_rm_watch
+        self._rm.argtypes = [ctypes.c_int, ctypes.c_int]
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+
+    def add_watch(self, path: str) -> int:
+        wd = self._add(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()), path)
+        return wd
+
+    def rm_watch(self, wd: int):
+        self._rm(self.fd, wd)
+
+    def read_events(self, timeout: float):
+        """(wd, mask, name) of the events that arrive within timeout seconds."""
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        pos = 0
+        while pos < len(data):
+            wd, mask, _, length = EVENT.unpack_from(data, pos)
+            pos += EVENT.size
+            name = os.fsdecode(data[pos : pos + length].rstrip(b"\0"))
+            pos += length
+            events.append((wd, mask, name))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class Watcher:
+    """Follows the tree under `root` on a background thread.
+
+    `mode` is "starting" (walking the tree), "inotify", "poll" or "off"
+    (stopped, or nothing to watch).
+    """
+
+    def __init__(self, root: str, on_change, poll_interval: float = 2.0, force_poll: bool = False):
+        self.root = os.path.realpath(root)
+        self.on_change = on_change
+        self.poll_interval = poll_interval
+        self.force_poll = force_poll
+        self.mode = "off"
+        self.events = 0
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._inotify = None
+        self._paths = {}  # wd -> directory
+        self._wds = {}  # directory -> wd
+        self._thread = None
+        self._complete = True  # False once a new directory could not be watched
+
+    # --- Lifecycle ---
+
+    def start(self):
+        """Start watching on the background thread. Returns at once."""
+        self.mode = "starting"
+        self._thread = threading.Thread(target=self._run, name="workspace-watch", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        if self.force_poll:
+            self._snapshot = self._poll_snapshot()
+            if self._snapshot is not None and not self._stop.is_set():
+                self.mode = "poll"
+                self._run_poll()
+        elif sys.platform.startswith("linux"):
+            try:
+                self._inotify = _Inotify()
+                self._watch_tree(self.root)
+            except OSError:  # no inotify, or too many directories for the watch limit
+                self._close_inotify()
+            else:
+                if not self._stop.is_set():
+                    # Entries cached while the walk ran may have changed before their directory was watched
+                    self.on_change(self.root, True)
+                    self.mode = "inotify"
+                    self._run_inotify()
+        if self.mode == "starting":
+            self.mode = "off"
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._close_inotify()
+        self.mode = "off"
+
+    def covers(self, path: str) -> bool:
+        """Whether inotify watches the directory at path (a real path)."""
+        with self._lock:
+            return self.mode == "inotify" and self._complete and path in self._wds
+
+    # --- inotify ---
+
+    def _watch_tree(self, top: str):
+        """Add a watch for top and every directory under it."""
+        stack = [top]
+        while stack and not self._stop.is_set():
+            directory = stack.pop()
+            with self._lock:
+                if len(self._wds) >= MAX_WATCHES:
+                    raise OSError(f"more than {MAX_WATCHES} directories under {self.root}")
+            try:
+                wd = self._inotify.add_watch(directory)
+            except FileNotFoundError:
+                continue
+            with self._lock:
+                self._paths[wd] = directory
+                self._wds[directory] = wd
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False) and not _skipped(entry.name):
+                            stack.append(entry.path)
+            except OSError:
+                continue
+
+    def _unwatch_tree(self, top: str):
+        prefix = top + os.sep
+        with self._lock:
+            gone = [d for d in self._wds if d == top or d.startswith(prefix)]
+            wds = [self._wds.pop(d) for d in gone]
+            for wd in wds:
+                self._paths.pop(wd, None)
+        for wd in wds:
+            self._inotify.rm_watch(wd)
+
+    def _run_inotify(self):
+        while not self._stop.is_set():
+            for wd, mask, name in self._inotify.read_events(0.5):
+                self.events += 1
+                if mask & IN_Q_OVERFLOW:
+                    self.on_change(self.root, True)
+                    continue
+                with self._lock:
+                    directory = self._paths.get(wd)
+                if directory is None:
+                    continue
+                if mask & IN_IGNORED:
+                    with self._lock:
+                        self._paths.pop(wd, None)
+                        if self._wds.get(directory) == wd:
+                            del self._wds[directory]
+                    continue
+                path = os.path.join(directory, name) if name else directory
+                is_dir = bool(mask & IN_ISDIR) or not name
+                if is_dir and name and not _skipped(name):
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        try:
+                            self._watch_tree(path)
+                        except OSError:  # over the limit: trust nothing from now on
+                            self._complete = False
+                    elif mask & (IN_MOVED_FROM | IN_DELETE):
+                        self._unwatch_tree(path)
+                self.on_change(path, is_dir)
+
+    def _close_inotify(self):
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+        with self._lock:
+            self._paths.clear()
+            self._wds.clear()
+
+    # --- Polling ---
+
+    def _poll_snapshot(self):
+        """path -> (mtime_ns, size, is_dir) for the tree, or None if it is too big to poll."""
+        snapshot = {}
+        stack = [self.root]
+        while stack:
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        is_dir = entry.is_dir(follow_symlinks=False)
+                        if is_dir and _skipped(entry.name):
+                            continue
+                        try:
+                            st = entry.stat(follow_symlinks=False)
+                        except OSError:
+                            continue
+                        snapshot[entry.path] = (st.st_mtime_ns, st.st_size, is_dir)
+                        if is_dir:
+                            stack.append(entry.path)
+            except OSError:
+                continue
+            if len(snapshot) > MAX_POLLED:
+                return None
+        return snapshot
+
+    def _run_poll(self):
+        while not self._stop.wait(self.poll_interval):
+            snapshot = self._poll_snapshot()
+            if snapshot is None:
+                self.mode = "off"  # the tree grew too big to poll
+                self.on_change(self.root, True)
+                return
+            old = self._snapshot
+            for path in old.keys() | snapshot.keys():
+                before, after = old.get(path), snapshot.get(path)
+                if before != after:
+                    self.events += 1
+                    self.on_change(path, (after or before)[2])
+            self._snapshot = snapshot